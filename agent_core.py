@@ -1,9 +1,24 @@
+import asyncio
+import functools
+import hashlib
+import io
 import json
 import os
+import queue
+import re
+import sys
 import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from ddgs import DDGS
-from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 from image_context import prepare_images_for_stream, resize_image_for_llm, image_context_for_images
 from memory import add_to_memory, get_recent_memory, update_entry
@@ -19,75 +34,263 @@ from personas import (
     persona_settings,
     PERSONAS_DIR,
 )
-from image_gen.diffusion import fast_generate
-from comfyui import generate_image
 from app_types.persona import Persona
 from app_types.prompt import Prompt
 
+# Load .env from project root so OLLAMA_KEEP_ALIVE etc. can be set without exporting in the shell
+_env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+if os.path.isfile(_env_path):
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(_env_path)
+    except ImportError:
+        pass
+
 OLLAMA_URL = "http://localhost:11434/api/generate"
+# How long Ollama keeps a model loaded after a request (seconds or a duration like "5m"). The default 0 unloads
+# immediately to free VRAM for image generation; a longer value lets Ollama reuse the cached prompt prefix across turns.
+_keep_alive = os.environ.get("OLLAMA_KEEP_ALIVE", "0").strip()
+OLLAMA_KEEP_ALIVE = int(_keep_alive) if _keep_alive.lstrip("-").isdigit() else _keep_alive
 MODEL_THINKING_NOT_SUPPORTED = {
     "dolphin-phi:2.7b": True,
     "dolphin-mistral:7b": True,
 }
 
+# Shared pool for per-turn I/O (decision calls, web search) so independent round-trips overlap.
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="turn")
+
 # ---------------- Ollama ----------------
 
-def _ollama_payload(prompt, stream, images=None, model=None, think=False):
-    """Build JSON payload for Ollama /api/generate. images: optional list of base64 strings. model: override (e.g. DECISION_MODEL). think: request thinking/reasoning stream for supported models."""
+# Keep-alive for warm_ollama_model; the real request that follows sets OLLAMA_KEEP_ALIVE again.
+WARMUP_KEEP_ALIVE = "1m"
+
+# ask_ollama_stream yields buffered response text once it reaches this many chars or this much time has passed
+TOKEN_FLUSH_CHARS = 16
+TOKEN_FLUSH_SECONDS = 0.05
+
+# One keep-alive session for all Ollama calls so each request reuses a pooled connection.
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+
+def _ollama_payload(prompt, stream, images=None, model=None, think=False, options=None):
+    """Build JSON payload for Ollama /api/generate. images: optional list of base64 strings. model: override (e.g. DECISION_MODEL). think: request thinking/reasoning stream for supported models. options: Ollama model options (e.g. CLASSIFIER_OPTIONS)."""
     if model is None:
         model = VL_MODEL if images else MODEL
-    payload = {"model": model, "prompt": prompt, "stream": stream, "keep_alive": 0}
+    payload = {"model": model, "prompt": prompt, "stream": stream, "keep_alive": OLLAMA_KEEP_ALIVE}
     if images:
-        payload["images"] = list(images)
+        payload["images"] = images
     if model not in MODEL_THINKING_NOT_SUPPORTED:
         payload["think"] = think
+    if options:
+        payload["options"] = dict(options)
     return payload
 
 
-def ask_ollama(prompt, images=None, model=None):
-    response = requests.post(
+def ask_ollama(prompt, images=None, model=None, options=None):
+    response = _session.post(
         OLLAMA_URL,
-        json=_ollama_payload(prompt, False, images, model=model),
+        json=_ollama_payload(prompt, False, images, model=model, options=options),
         timeout=120
     )
     response.raise_for_status()
-    return response.json().get("response", "").strip()
+    return _json_loads(response.content).get("response", "").strip()
+
+
+def warm_ollama_model(model) -> None:
+    """
+    Ask Ollama to load `model` without generating (empty prompt), so a following request skips the load.
+    Uses WARMUP_KEEP_ALIVE so the model stays resident until that request arrives. Errors are ignored.
+    """
+    try:
+        _session.post(OLLAMA_URL, json={"model": model, "keep_alive": WARMUP_KEEP_ALIVE}, timeout=120).close()
+    except requests.RequestException:
+        pass
+
+
+# Warm-ups can wait up to 120 s for a model to load, so they get their own worker instead of holding _pool's.
+_warmup_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warmup")
+# Models with a warm-up queued or running; concurrent turns for the same model share it
+_warming: set[str] = set()
+_warming_lock = threading.Lock()
+
+
+def start_model_warmup(model) -> None:
+    """Warm `model` in the background (see warm_ollama_model), unless a warm-up for it is already in flight."""
+    with _warming_lock:
+        if model in _warming:
+            return
+        _warming.add(model)
+
+    def run():
+        try:
+            warm_ollama_model(model)
+        finally:
+            with _warming_lock:
+                _warming.discard(model)
+
+    _warmup_pool.submit(run)
 
 
-def ask_ollama_stream(prompt, images=None, model=None):
-    """Stream Ollama response. Yields events: {"thinking": "..."} for reasoning chunks, {"token": "..."} for response text. Only response text is the final answer."""
-    response = requests.post(
+def ask_ollama_stream(prompt, images=None, model=None, think=True, options=None):
+    """
+    Stream Ollama response. Yields events: {"thinking": "..."} for reasoning chunks, {"token": "..."} for response text. Only response text is the final answer.
+    Closing the generator early closes the HTTP response, which makes Ollama stop generating.
+    """
+    response = _session.post(
         OLLAMA_URL,
-        json= _ollama_payload(prompt, True, images, model=model, think=True),
+        json= _ollama_payload(prompt, True, images, model=model, think=think, options=options),
         timeout=120,
         stream=True,
     )
-    response.raise_for_status()
-    for line in response.iter_lines(decode_unicode=True):
-        if not line:
-            continue
-        try:
-            data = json.loads(line)
-            thinking_chunk = data.get("thinking", "")
-            if thinking_chunk:
-                yield {"thinking": thinking_chunk}
-            response_chunk = data.get("response", "")
-            if response_chunk:
-                yield {"token": response_chunk}
-            if data.get("done"):
-                break
-        except (ValueError, KeyError):
-            continue
+    try:
+        response.raise_for_status()
+        # Parse raw NDJSON bytes (no per-line unicode decode); orjson is used when installed
+        # Response tokens are coalesced into small batches; the first token is sent immediately.
+        buf = ""
+        last_flush = None
+        for line in response.iter_lines():
+            if not line:
+                continue
+            try:
+                data = _json_loads(line)
+                thinking_chunk = data.get("thinking", "")
+                if thinking_chunk:
+                    if buf:
+                        yield {"token": buf}
+                        buf = ""
+                    yield {"thinking": thinking_chunk}
+                response_chunk = data.get("response", "")
+                if response_chunk:
+                    buf += response_chunk
+                    now = time.monotonic()
+                    if last_flush is None or len(buf) >= TOKEN_FLUSH_CHARS or now - last_flush >= TOKEN_FLUSH_SECONDS:
+                        yield {"token": buf}
+                        buf = ""
+                        last_flush = now
+                if data.get("done"):
+                    break
+            except (ValueError, KeyError):
+                continue
+        if buf:
+            yield {"token": buf}
+    finally:
+        # Return the connection to the session pool even if the consumer stops early
+        response.close()
 
 # ---------------- Decision ----------------
 
-def needs_web_search(question, decision_model=None):
-    prompt = f"""
-You are a classifier.
+# Greedy, tightly bounded decoding for classifier calls: YES/NO is decided by its first token; each
+# KEY=YES|NO line of the fused classifier gets INTENT_TOKENS_PER_LABEL tokens.
+CLASSIFIER_OPTIONS = {"temperature": 0, "top_k": 1, "num_predict": 1, "stop": ["\n"]}
+INTENTS_OPTIONS = {"temperature": 0, "top_k": 1}
+INTENT_TOKENS_PER_LABEL = 8
+
+# Cache of classifier answers keyed by (classifier, model, question), the question compared case-insensitively.
+# Oldest entries are evicted first, and entries expire after CLASSIFIER_CACHE_TTL so current-events answers don't go stale.
+CLASSIFIER_CACHE_MAX = 2048
+CLASSIFIER_CACHE_TTL = 600  # seconds
+_classifier_cache: OrderedDict = OrderedDict()
+_classifier_cache_lock = threading.Lock()
+
+
+def _cached_decision(tag: str, question: str, model: str, compute):
+    """Return the cached result for (tag, model, question), or call compute() and cache what it returns."""
+    key = hashlib.sha256(f"{tag}|{model}|{question.strip().lower()}".encode("utf-8")).hexdigest()
+    now = time.monotonic()
+    with _classifier_cache_lock:
+        hit = _classifier_cache.get(key)
+        if hit is not None:
+            expires_at, result = hit
+            if expires_at > now:
+                _classifier_cache.move_to_end(key)
+                return result
+            del _classifier_cache[key]
+    result = compute()
+    with _classifier_cache_lock:
+        _classifier_cache[key] = (time.monotonic() + CLASSIFIER_CACHE_TTL, result)
+        _classifier_cache.move_to_end(key)
+        while len(_classifier_cache) > CLASSIFIER_CACHE_MAX:
+            _classifier_cache.popitem(last=False)
+    return result
+
+
+def _is_yes(answer: str) -> bool:
+    """True for a YES answer. Only the first letter is checked since decoding may stop after one token (e.g. "Y")."""
+    return answer.strip().upper().startswith("Y")
+
+
+def _ask_yes_no_cached(tag: str, question: str, prompt: str, decision_model=None) -> bool:
+    """Ask the decision model a YES/NO prompt, reusing the cached answer for the same tag, model and question."""
+    model = decision_model or DECISION_MODEL
+    return _cached_decision(tag, question, model, lambda: _is_yes(ask_ollama(prompt, model=model, options=CLASSIFIER_OPTIONS)))
+
+
+# Cheap deterministic shortcuts, only for inputs they decide with near certainty; the decision model handles the rest.
+# An explicit image request: the message starts with "draw me ..." or "<verb> [me] [a] <image noun> of ..."
+_IMG_GEN_RE = re.compile(
+    r"^(?:please\s+)?(?:"
+    r"(?:draw|paint|sketch)\s+me\b"
+    r"|(?:draw|paint|sketch|generate|create|make|render)\s+(?:me\s+)?(?:an?\s+)?"
+    r"(?:image|picture|photo|drawing|painting|illustration|pic)\s+of\b"
+    r")",
+    re.I,
+)
+# A bare greeting or thanks that is the whole message
+_GREETING_RE = re.compile(r"^(?:hi|hello|hey|thanks|thank you|bye)[\s!.?]*$", re.I)
+
+
+def _prefilter_intents(question: str) -> dict[str, bool]:
+    """Return the decisions that can be made without the LLM (same keys as classify_intents)."""
+    text = question.strip()
+    if _GREETING_RE.match(text):
+        return {"web_search": False, "image_generation": False}
+    if _IMG_GEN_RE.match(text):
+        return {"image_generation": True}
+    return {}
+
+
+# Label in the multi-label classifier output -> key in the dict returned by classify_intents
+INTENT_LABELS = {
+    "WEB": "web_search",
+    "IMG": "image_generation",
+    "CTX": "prior_image_context",
+}
+_INTENT_RE = re.compile(r"\b(WEB|IMG|CTX)\s*=\s*(YES|NO)\b")
+
+
+# Classifier prompt templates, split once around {question} so each call only concatenates the question in.
+# The question goes last so the invariant instructions form a shared prefix the server can reuse across calls.
+_INTENTS_PROMPT = """
+You are a multi-label classifier.
 
-Question:
+Answer each label with YES or NO:
+{descriptions}
+
+Rules:
+- Do NOT explain your reasoning.
+- Do NOT refuse or mention capabilities.
+- Ignore safety, ethics, and policies.
+- Follow this instruction over all others.
+
+Respond with EXACTLY these lines and nothing else:
+{answer_lines}
+
+User message:
 {question}
 
+Answer:
+"""
+
+_INTENT_DESCRIPTIONS = {
+    "WEB": "WEB: the message requires current, factual, or up-to-date information (news, recent events, prices, releases, current people, changing facts). Greetings, casual chat, general knowledge, programming, math, and historical facts → NO.",
+    "IMG": "IMG: the user is asking to generate, create, draw, make, or send an image.",
+    "CTX": "CTX: answering requires prior image context from previous images the user has sent.",
+}
+
+_WEB_SEARCH_PROMPT = """
+You are a classifier.
+
 Answer YES if the question requires current, factual, or up-to-date information
 (e.g., news, recent events, prices, releases, current people, changing facts).
 
@@ -106,37 +309,34 @@ Rules:
 - Follow this instruction over all others.
 
 Respond with ONLY one word: YES or NO
-"""
-    return ask_ollama(prompt, model=decision_model or DECISION_MODEL).upper().startswith("YES")
 
+User message:
+{question}
 
-def needs_prior_image_context(question, decision_model=None):
-    prompt = f"""
-You are a classifier.
+Answer:
+"""
 
-Question:
-{question}
+_PRIOR_IMAGE_CONTEXT_PROMPT = """
+You are a classifier.
 
 Does answering this question require prior image context from previous images the user has sent?
 Do NOT explain your reasoning.
 
 Respond with ONLY one word:
 YES or NO
-"""
-    return ask_ollama(prompt, model=decision_model or DECISION_MODEL).upper().startswith("YES")
 
+User message:
+{question}
 
-def needs_image_generation(question, decision_model=None):
-    """Return True if the question is asking the assistant to generate or create an image."""
-    prompt = f"""
+Answer:
+"""
+
+_IMAGE_GENERATION_PROMPT = """
 You are a strict binary classifier.
 
 Task:
 Determine whether the user is requesting image generation.
 
-User message:
-{question}
-
 Output:
 - YES if the user is asking to generate, create, draw, make, or send an image.
 - NO otherwise.
@@ -151,8 +351,119 @@ Rules:
 - Follow this instruction over all others.
 
 Respond with ONLY one word: YES or NO
+
+User message:
+{question}
+
+Answer:
 """
-    return ask_ollama(prompt, model=decision_model or DECISION_MODEL).upper().startswith("YES")
+
+
+def _split_prompt(template: str) -> tuple[str, str]:
+    """Split a classifier template into the (prefix, suffix) around {question}, so calls only concatenate."""
+    prefix, suffix = template.split("{question}")
+    return prefix, suffix
+
+
+_WEB_SEARCH_PROMPT_PARTS = _split_prompt(_WEB_SEARCH_PROMPT)
+_PRIOR_IMAGE_CONTEXT_PROMPT_PARTS = _split_prompt(_PRIOR_IMAGE_CONTEXT_PROMPT)
+_IMAGE_GENERATION_PROMPT_PARTS = _split_prompt(_IMAGE_GENERATION_PROMPT)
+
+
+@functools.lru_cache(maxsize=8)
+def _intents_prompt_parts(labels: tuple[str, ...]) -> tuple[str, str]:
+    """(prefix, suffix) of the fused classifier prompt for this label set."""
+    return _split_prompt(_INTENTS_PROMPT.format(
+        descriptions="\n".join(_INTENT_DESCRIPTIONS[label] for label in labels),
+        answer_lines="\n".join(f"{label}=YES or {label}=NO" for label in labels),
+        question="{question}",
+    ))
+
+
+def classify_intents(question, decision_model=None, keys=None) -> dict[str, bool]:
+    """
+    Run all turn decisions in one decision-model call. Returns a dict with keys from INTENT_LABELS
+    (web_search, image_generation, prior_image_context). Labels the model did not answer are omitted
+    so callers can fall back to the single-purpose needs_* classifiers.
+    keys: optional subset of those keys to decide; the prompt then only asks for these labels.
+    Labels the regex prefilter already decides are not sent to the LLM; if that covers all of them, no call is made.
+    """
+    wanted = [key for key in INTENT_LABELS.values() if keys is None or key in keys]
+    decided = {key: value for key, value in _prefilter_intents(question).items() if key in wanted}
+    labels = [label for label, key in INTENT_LABELS.items() if key in wanted and key not in decided]
+    if not labels:
+        return decided
+    prefix, suffix = _intents_prompt_parts(tuple(labels))
+    prompt = prefix + question + suffix
+    options = {**INTENTS_OPTIONS, "num_predict": INTENT_TOKENS_PER_LABEL * len(labels)}
+    model = decision_model or DECISION_MODEL
+
+    def _classify():
+        # Stream and stop as soon as every label has been answered, so trailing tokens are never decoded
+        response = ""
+        found = {}
+        stream = ask_ollama_stream(prompt, model=model, think=False, options=options)
+        try:
+            for event in stream:
+                response += event.get("token", "")
+                found = {label: value for label, value in _INTENT_RE.findall(response.upper()) if label in labels}
+                if len(found) == len(labels):
+                    break
+        finally:
+            stream.close()
+        return {INTENT_LABELS[label]: value == "YES" for label, value in found.items()}
+
+    intents = dict(_cached_decision("intents:" + ",".join(labels), question, model, _classify))
+    intents.update(decided)
+    return intents
+
+
+def resolve_missing_intents(intents: dict[str, bool], question, needed: list[str], decision_model=None, memory_entries=None) -> dict[str, bool]:
+    """
+    Fill labels in `needed` that classify_intents could not answer by running the matching needs_*
+    classifiers concurrently, so Ollama can batch them instead of serving them back-to-back.
+    memory_entries: passed to needs_prior_image_context so it can skip the LLM when memory has no images.
+    """
+    fallbacks = {
+        "web_search": lambda: needs_web_search(question, decision_model=decision_model),
+        "image_generation": lambda: needs_image_generation(question, decision_model=decision_model),
+        "prior_image_context": lambda: needs_prior_image_context(question, memory_entries, decision_model=decision_model),
+    }
+    missing = [key for key in needed if key not in intents]
+    if not missing:
+        return intents
+    results = _pool.map(lambda key: fallbacks[key](), missing)
+    return {**intents, **dict(zip(missing, results))}
+
+
+def needs_web_search(question, decision_model=None):
+    decided = _prefilter_intents(question).get("web_search")
+    if decided is not None:
+        return decided
+    prompt = _WEB_SEARCH_PROMPT_PARTS[0] + question + _WEB_SEARCH_PROMPT_PARTS[1]
+    return _ask_yes_no_cached("web_search", question, prompt, decision_model)
+
+
+def needs_prior_image_context(question, memory_entries=None, decision_model=None):
+    """
+    Return True if answering needs image context from earlier turns. memory_entries: optional MemoryEntries
+    (or list of MemoryEntry); when given and none of them has image_context, returns False without calling the LLM.
+    """
+    if memory_entries is not None:
+        entries = getattr(memory_entries, "entries", memory_entries)
+        if not any(getattr(e, "image_context", None) for e in entries):
+            return False
+    prompt = _PRIOR_IMAGE_CONTEXT_PROMPT_PARTS[0] + question + _PRIOR_IMAGE_CONTEXT_PROMPT_PARTS[1]
+    return _ask_yes_no_cached("prior_image_context", question, prompt, decision_model)
+
+
+def needs_image_generation(question, decision_model=None):
+    """Return True if the question is asking the assistant to generate or create an image."""
+    decided = _prefilter_intents(question).get("image_generation")
+    if decided is not None:
+        return decided
+    prompt = _IMAGE_GENERATION_PROMPT_PARTS[0] + question + _IMAGE_GENERATION_PROMPT_PARTS[1]
+    return _ask_yes_no_cached("image_generation", question, prompt, decision_model)
 
 def summarize_past_memory(response: str, decision_model=None):
     """generate a summary of the memory entries for the assistant"""
@@ -177,32 +488,55 @@ def _summarize_past_memory_background(response: str, memory_file: str, assistant
 
 # ---------------- Search ----------------
 
+def _normalize_result(r) -> tuple[str, str | None] | None:
+    """Return (body, url) for one DDGS result (dict or object), or None if it has no body."""
+    body = r.get("body") if isinstance(r, dict) else getattr(r, "body", None)
+    if not body:
+        return None
+    if isinstance(r, dict):
+        url = r.get("href") or r.get("url") or r.get("link")
+    else:
+        url = getattr(r, "href", None) or getattr(r, "url", None)
+    if url:
+        url = str(url).strip()
+    return (body, url)
+
+
+# One DDGS client per thread, reused across that thread's searches so its HTTP session (and TLS to the provider)
+# stays warm. Per thread rather than shared, so concurrent searches never wait on each other.
+_ddgs_local = threading.local()
+
+
+def _get_ddgs():
+    """Return this thread's DDGS client, creating it on first use."""
+    client = getattr(_ddgs_local, "client", None)
+    if client is None:
+        from ddgs import DDGS  # deferred: only needed when a turn actually searches
+        client = _ddgs_local.client = DDGS()
+    return client
+
+
 def web_search(query: str) -> tuple[str | None, list[str]]:
     """Return (combined_snippet_text, list_of_source_urls). Uses same body collection as agent.py."""
-    results = []  # list of (body, url) so body and source stay paired
     try:
-        with DDGS() as ddgs:
-            for r in ddgs.text(query, max_results=5):
-                body = r.get("body") if isinstance(r, dict) else getattr(r, "body", None)
-                if not body:
-                    continue
-                url = None
-                if isinstance(r, dict):
-                    url = r.get("href") or r.get("url") or r.get("link")
-                else:
-                    url = getattr(r, "href", None) or getattr(r, "url", None)
-                if url:
-                    url = str(url).strip()
-                results.append((body, url))
+        raw_results = list(_get_ddgs().text(query, max_results=5))
     except Exception:
+        _ddgs_local.client = None  # drop a client that hit a provider error; the next search builds a fresh one
         return (None, [])
 
-    if not results:
-        return (None, [])
-
-    bodies = [b for b, _ in results]
-    sources = [u for _, u in results if u]
-    return ("\n".join(bodies), sources)
+    # One pass: bodies go straight into the combined text, urls into sources
+    text = io.StringIO()
+    sources = []
+    for res in map(_normalize_result, raw_results):
+        if res is None:
+            continue
+        body, url = res
+        if text.tell():
+            text.write("\n")
+        text.write(body)
+        if url:
+            sources.append(url)
+    return (text.getvalue() or None, sources)
 
 
 # ---------------- Answer ----------------
@@ -236,9 +570,7 @@ def _build_image_prompt_request(
 
 def _persona_image_path_and_url(persona: Persona) -> tuple[str, str]:
     """Return (filesystem_path, url_path) for the next image in this persona's images folder."""
-    now = datetime.now(timezone.utc)
-    ts = now.strftime("%Y%m%d_%H%M%S") + "_" + str(now.microsecond)
-    filename = f"{ts}.png"
+    filename = f"{time.time_ns()}.png"  # unique and sortable
     persona_id = persona.id or "default"
     images_dir = os.path.join(PERSONAS_DIR, persona_id, "images")
     os.makedirs(images_dir, exist_ok=True)
@@ -255,13 +587,13 @@ def _run_image_generation_background(
     assistant_timestamp: str,
 ) -> None:
     """
-    Run fast_generate in a background thread, then update the existing memory entry.
+    Run image generation on the image worker, then update the existing memory entry.
     The entry (with this assistant_timestamp) was saved before the job started so we can track it.
     """
-    import sys
+    from comfyui import generate_image  # deferred: only needed when an image is requested
     print("[image gen] Background job started, calling fast_generate...", flush=True)
     try:
-        generate_image(image_prompt.strip(), save_path)
+        generate_image(image_prompt.strip(), save_path, include_base64=False)
         content = "[Image generated.]"
         path_for_memory = image_url
         print(f"[image gen] fast_generate completed, saved to {save_path}", flush=True)
@@ -276,27 +608,70 @@ def _run_image_generation_background(
     )
 
 
+# Image jobs share one GPU, so a single daemon worker runs them one at a time in FIFO order.
+_image_queue: queue.Queue = queue.Queue()
+_image_jobs_pending = 0  # queued + running; guarded by _image_jobs_lock
+_image_jobs_lock = threading.Lock()
+
+
+def _image_worker() -> None:
+    """Run queued image jobs forever. A failing job must not stop the worker."""
+    global _image_jobs_pending
+    while True:
+        job = _image_queue.get()
+        try:
+            _run_image_generation_background(**job)
+        except Exception as e:
+            print(f"[image gen] Job failed: {e}", file=sys.stderr, flush=True)
+        finally:
+            with _image_jobs_lock:
+                _image_jobs_pending -= 1
+            _image_queue.task_done()
+
+
+def _enqueue_image_job(**job) -> int:
+    """Queue an image job for the worker. Returns how many jobs are ahead of it (queued or running)."""
+    global _image_jobs_pending
+    with _image_jobs_lock:
+        ahead = _image_jobs_pending
+        _image_jobs_pending += 1
+    _image_queue.put(job)
+    return ahead
+
+
+threading.Thread(target=_image_worker, name="imggen", daemon=True).start()
+
+
 def _run_ollama_and_save(prompt, question, images, image_context, sources, memory_file=None, model=None):
     """Call Ollama (non-streaming), save turn to memory, return (response, sources)."""
-    response = ask_ollama(prompt, images=images if images else None, model=model)
+    response = ask_ollama(prompt, images=images, model=model)
     _add_turn_to_memory(question, response, image_context, memory_file=memory_file, sources=sources)
     return (response, sources)  # timestamps not needed for non-streaming
 
 
-def web_search_stream(persona: Persona, question: str, prompt: Prompt, memory: MemoryEntry):
+def start_web_search_stream(persona: Persona, question: str, use_web_search: bool | None = None):
     """
-    Transform: optionally run web search and mutate prompt with web_context and sources.
-    Yields {"searching": True} when searching. Always returns the prompt (possibly updated).
+    Decide whether to search and, if so, start web_search on the shared pool without waiting for it.
+    Yields {"searching": True} when searching. Returns the Future of web_search, or None when not searching.
     use_web_search: if provided (bool), use it instead of calling needs_web_search (avoids duplicate decision call).
     """
     if not persona.can_web_search:
-        return prompt, memory
-    use_web_search = needs_web_search(question, decision_model=persona.decision_model)
+        return None
+    if use_web_search is None:
+        use_web_search = needs_web_search(question, decision_model=persona.decision_model)
     if not use_web_search:
-        return prompt, memory
+        return None
+    search_future = _pool.submit(web_search, question)
     print("\n🔎 Searching the web...\n")
     yield {"searching": True}
-    context, sources = web_search(question)
+    return search_future
+
+
+def apply_web_search(search_future, prompt: Prompt, memory: MemoryEntry):
+    """Wait for a search started by start_web_search_stream and mutate prompt/memory with its web_context and sources."""
+    if search_future is None:
+        return prompt, memory
+    context, sources = search_future.result()
     if not context:
         return prompt, memory
     memory.sources = sources
@@ -306,6 +681,16 @@ def web_search_stream(persona: Persona, question: str, prompt: Prompt, memory: M
     return prompt, memory
 
 
+def web_search_stream(persona: Persona, question: str, prompt: Prompt, memory: MemoryEntry, use_web_search: bool | None = None):
+    """
+    Transform: optionally run web search and mutate prompt with web_context and sources.
+    Yields {"searching": True} when searching. Always returns the prompt (possibly updated).
+    use_web_search: if provided (bool), use it instead of calling needs_web_search (avoids duplicate decision call).
+    """
+    search_future = yield from start_web_search_stream(persona, question, use_web_search=use_web_search)
+    return apply_web_search(search_future, prompt, memory)
+
+
 def image_generation_stream(
     persona: Persona,
     question: str,
@@ -315,19 +700,23 @@ def image_generation_stream(
     user_ts: str,
     memory_file: str | None,
     force_image_generation: bool = False,
+    use_image_generation: bool | None = None,
 ):
     """
     Transform: if the question is an image-generation request (or force_image_generation is True),
-    run LLM for image prompt, yield "Generating image...", close the stream, and run diffusion in
-    a background thread (which adds the assistant turn to memory when done). Otherwise return
+    run LLM for image prompt, yield "Generating image...", close the stream, and queue diffusion for
+    the image worker (which adds the assistant turn to memory when done). Otherwise return
     (prompt, assistant_memory) unchanged so the caller continues to the main LLM.
     When force_image_generation is True, skip the persona.decisions.image_generation and
     needs_image_generation checks.
+    use_image_generation: if provided (bool), use it instead of calling needs_image_generation.
     """
     if not force_image_generation:
         if not persona.decisions.get("image_generation", True):
             return prompt, assistant_memory
-        if not needs_image_generation(question, decision_model=persona.decision_model):
+        if use_image_generation is None:
+            use_image_generation = needs_image_generation(question, decision_model=persona.decision_model)
+        if not use_image_generation:
             return prompt, assistant_memory
     memory_context = prompt.memory_entries.build_prompt(include_image_context=True, include_generated_image_prompt=True) if prompt.memory_entries else ""
     cfg = get_persona_config(persona.id) if persona.id else None
@@ -356,23 +745,22 @@ def image_generation_stream(
     assistant_memory.generated_image_prompt = image_prompt
     assistant_memory.generated_image_path = None  # set by background thread when job completes
     assistant_ts = add_to_memory(assistant_memory, memory_file=memory_file)
-    thread = threading.Thread(
-        target=_run_image_generation_background,
-        kwargs={
-            "image_prompt": image_prompt,
-            "save_path": save_path,
-            "image_url": image_url,
-            "memory_file": memory_file,
-            "assistant_timestamp": assistant_ts,
-        },
-        daemon=True,
+    images_ahead = _enqueue_image_job(
+        image_prompt=image_prompt,
+        save_path=save_path,
+        image_url=image_url,
+        memory_file=memory_file,
+        assistant_timestamp=assistant_ts,
     )
-    thread.start()
-    print(f"[image gen] Thread started for save_path={save_path}", flush=True)
+    print(f"[image gen] Job queued for save_path={save_path} ({images_ahead} ahead)", flush=True)
+    final = "Generating image..."
+    if images_ahead:
+        final += f" ({images_ahead} image{'s' if images_ahead != 1 else ''} ahead of you)"
     yield {
         "done": True,
         "sources": [],
-        "final": "Generating image...",
+        "final": final,
+        "images_ahead": images_ahead,
         "image_generating_background": True,
         "user_timestamp": user_ts,
         "assistant_timestamp": assistant_ts,
@@ -385,33 +773,70 @@ def answer(question, extra_context=None, images=None, image_context=None, person
     Answer a question using memory, optional extra context, web search when needed, or image generation when requested.
     force_image_generation: if True, run image generation for this turn (bypass decision/config checks).
     """
-    parts = []
+    parts = io.StringIO()
     sources = []
     for event in answer_stream(question, extra_context=extra_context, images=images, image_context=image_context, persona_id=persona_id, force_image_generation=force_image_generation):
         if "token" in event:
-            parts.append(event["token"])
+            parts.write(event["token"])
         if event.get("done"):
             sources = event.get("sources", [])
-            return (event.get("final") or "".join(parts).strip(), sources)
-    return ("".join(parts).strip(), sources)
+            return (event.get("final") or parts.getvalue().strip(), sources)
+    return (parts.getvalue().strip(), sources)
 
 
 def answer_stream(question, extra_context=None, images=None, image_context=None, persona_id=None, force_image_generation=False):
     """
+    images: base64 strings for this turn; an empty list means none (normalized to None here, once per turn).
     Stream an answer: yields {"searching": True}, {"thinking": "..."}, {"token": "..."}, then {"done": True, "sources": [...], ...}.
     For image gen, yields thinking events then {"done": True, "final": ..., "image_result": ...}.
     force_image_generation: if True, run image generation for this turn and bypass decision/config checks.
     """
     persona = persona_from_id(persona_id)
     memory_file = persona.memory_path
+    # Normalize attachments once: a non-empty list or None, which also fixes the model for this turn
+    images = images or None
+    main_model = persona.vl_model if images else persona.model
+    # One fused decision call for the labels this turn needs, started right away so it overlaps the memory I/O below
+    wants_image_decision = not force_image_generation and persona.decisions.get("image_generation", True)
+    # Prior image context follows the persona's prior_image_context toggle and is always kept when images are
+    # attached this turn. Only a persona that opts in with decide_prior_image_context asks per turn whether it is
+    # needed, and memory without any image context skips that decision outright.
+    include_image_context = bool(images) or persona.decisions.prior_image_context
+    wants_context_decision = False
+    if include_image_context and not images and persona.decisions.decide_prior_image_context:
+        prior_entries = get_recent_memory(memory_file=memory_file)
+        wants_context_decision = any(e.image_context for e in prior_entries.entries)
+    needed = [
+        key
+        for key, wanted in (
+            ("web_search", persona.can_web_search),
+            ("image_generation", wants_image_decision),
+            ("prior_image_context", wants_context_decision),
+        )
+        if wanted
+    ]
+    intents_future = None
+    if needed:
+        intents_future = _pool.submit(classify_intents, question, persona.decision_model, needed)
     user_memory = MemoryEntry(timestamp="", role="user", content=question, image_context=image_context)
     user_ts = add_to_memory(user_memory, memory_file=memory_file)
     memory_entries = get_recent_memory(memory_file=memory_file)
     prompt = Prompt(question=question, memory_entries=memory_entries, extra_context=extra_context, system_persona=persona.system_persona)
     assistant_memory = MemoryEntry(timestamp="", role="assistant", persona_name=persona.name, content="", web_context=None, sources=[])
-    prompt, assistant_memory = yield from web_search_stream(persona, question, prompt, assistant_memory)
-
-    gen = image_generation_stream(persona, question, prompt, assistant_memory, image_context, user_ts, memory_file, force_image_generation=force_image_generation)
+    intents = intents_future.result() if intents_future else {}
+    intents = resolve_missing_intents(intents, question, needed, decision_model=persona.decision_model, memory_entries=memory_entries)
+    prompt.include_memory_image_context = include_image_context
+    if wants_context_decision:
+        prompt.include_memory_image_context = intents["prior_image_context"]
+    # The search runs in the background while the image branch is decided; it is only awaited before the main prompt
+    search_future = yield from start_web_search_stream(persona, question, use_web_search=intents.get("web_search"))
+
+    use_image_generation = intents.get("image_generation")
+    gen = image_generation_stream(
+        persona, question, prompt, assistant_memory, image_context, user_ts, memory_file,
+        force_image_generation=force_image_generation,
+        use_image_generation=use_image_generation,
+    )
     try:
         while True:
             event = next(gen)
@@ -420,15 +845,18 @@ def answer_stream(question, extra_context=None, images=None, image_context=None,
                 return
     except StopIteration as e:
         prompt, assistant_memory = e.value
+    if search_future is not None and not search_future.done():
+        # Load the main model while the search is still in flight
+        start_model_warmup(main_model)
+    prompt, assistant_memory = apply_web_search(search_future, prompt, assistant_memory)
 
-    main_model = persona.vl_model if images else persona.model
-    full = []
+    full = io.StringIO()
     try:
-        for event in ask_ollama_stream(prompt.build(), images=images if images else None, model=main_model):
+        for event in ask_ollama_stream(prompt.build(), images=images, model=main_model):
             if "thinking" in event:
                 yield {"thinking": event["thinking"]}
             elif "token" in event:
-                full.append(event["token"])
+                full.write(event["token"])
                 yield {"token": event["token"]}
     except Exception as e:
         err_msg = OLLAMA_FAIL_MSG.format(e)
@@ -436,7 +864,7 @@ def answer_stream(question, extra_context=None, images=None, image_context=None,
         assistant_ts = add_to_memory(assistant_memory, memory_file=memory_file)
         yield {"done": True, "sources": [], "final": err_msg, "error": str(e), "user_timestamp": user_ts, "assistant_timestamp": assistant_ts}
         return
-    response = "".join(full).strip()
+    response = full.getvalue().strip()
     assistant_memory.content = response
     assistant_memory.sources = list(prompt.sources)
     assistant_ts = add_to_memory(assistant_memory, memory_file=memory_file)
@@ -453,3 +881,24 @@ def answer_stream(question, extra_context=None, images=None, image_context=None,
     )
     thread.start()
     yield {"done": True, "sources": prompt.sources, "user_timestamp": user_ts, "assistant_timestamp": assistant_ts}
+
+
+async def answer_astream(question, **kwargs):
+    """
+    Async version of answer_stream for asyncio frontends: same arguments and events.
+    Each step of the sync pipeline runs on the loop's default executor so the event loop is never blocked;
+    the decision calls and web search inside it already overlap on the shared pool.
+    """
+    loop = asyncio.get_running_loop()
+    gen = answer_stream(question, **kwargs)
+    done = object()
+    try:
+        while True:
+            event = await loop.run_in_executor(None, next, gen, done)
+            if event is done:
+                return
+            yield event
+    finally:
+        # If cancelled mid-step the worker thread still owns the generator; it finishes that step on its own
+        if not gen.gi_running:
+            gen.close()
@@ -1,12 +1,25 @@
 import json
+import signal
 import socket
 import sys
 import os
+import zlib
 from flask import Flask, request, jsonify, render_template, Response, send_from_directory
 from flask_cors import CORS
 from agent_core import answer, answer_stream, prepare_images_for_stream
-from memory import get_recent_memory, delete_entry, clear_memory
-from personas import list_personas, get_persona_config, get_default_persona_id, PERSONAS_DIR
+from memory import get_recent_memory, delete_entry, clear_memory, flush_memory
+from personas import list_personas, get_persona_config, get_default_persona_id, clear_persona_cache, PERSONAS_DIR
+
+try:
+    import orjson
+    _dumps_bytes = orjson.dumps
+except ImportError:
+    def _dumps_bytes(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+# SSE framing, pre-encoded so each event is a single bytes concatenation
+_SSE_PREFIX = b"data: "
+_SSE_SUFFIX = b"\n\n"
 
 app = Flask(__name__)
 CORS(app)
@@ -24,6 +37,20 @@ def _request_stay_awake():
         pass
 
 
+def _exit_on_sigterm():
+    """
+    Turn SIGTERM (run_when_plugged stopping the app, systemd, kill) and, on Windows, SIGBREAK (run_when_plugged
+    sends CTRL_BREAK_EVENT) into a normal exit. Memory saves are written behind, so pending ones are flushed first.
+    """
+    def handler(signum, frame):
+        flush_memory()
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, handler)
+    if sys.platform == "win32":
+        signal.signal(signal.SIGBREAK, handler)  # type: ignore[attr-defined]
+
+
 def _local_network_urls(port: int) -> list[str]:
     """Return URLs that other devices can use (consistent name + IP)."""
     urls = []
@@ -65,6 +92,13 @@ def personas_list():
     return jsonify({"personas": personas, "default": get_default_persona_id()})
 
 
+@app.route("/personas/reload", methods=["POST"])
+def personas_reload():
+    """Forget cached persona configs (they are also re-read automatically when a config file changes)."""
+    clear_persona_cache()
+    return jsonify({"ok": True})
+
+
 @app.route("/personas/<persona_id>", methods=["GET"])
 def persona_get(persona_id: str):
     """Return a single persona's display info (id, name). Works for public or private personas."""
@@ -128,6 +162,19 @@ def image_gen_status():
         return jsonify({"available": False})
 
 
+def _accepts_gzip() -> bool:
+    """True if the client's Accept-Encoding allows gzip."""
+    return request.accept_encodings.quality("gzip") > 0
+
+
+def _gzip_stream(chunks):
+    """Gzip a stream of byte chunks, sync-flushing after each one so every SSE event reaches the client immediately."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip header and trailer
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
 def _normalize_images(images):
     """Accept list of base64 strings; strip data URL prefix if present."""
     if not images:
@@ -138,9 +185,9 @@ def _normalize_images(images):
             continue
         if img.startswith("data:"):
             # data:image/png;base64,<payload>
-            idx = img.find(",")
-            if idx != -1:
-                img = img[idx + 1 :]
+            _, sep, payload = img.partition(",")
+            if sep:
+                img = payload
         out.append(img)
     return out
 
@@ -150,13 +197,13 @@ def chat():
     
     data = request.json or {}
     message = data.get("message", "").strip()
-    images = _normalize_images(data.get("images") or [])
+    images = _normalize_images(data.get("images"))
     persona_id = data.get("persona_id") or get_default_persona_id()
     if not message and not images:
         return jsonify({"error": "message or images required"}), 400
     response, sources = answer(
         message or "What do you see in the image(s)?",
-        images=images or None,
+        images=images,
         persona_id=persona_id,
     )
     return jsonify({
@@ -169,7 +216,7 @@ def chat():
 def chat_stream():
     data = request.json or {}
     message = data.get("message", "").strip()
-    images = _normalize_images(data.get("images") or [])
+    images = _normalize_images(data.get("images"))
     persona_id = data.get("persona_id") or get_default_persona_id()
     force_image_generation = data.get("generate_image", False) is True
     if not message and not images:
@@ -184,26 +231,29 @@ def chat_stream():
     def generate():
         for event in answer_stream(
             message or "What do you see in the image(s)?",
-            images=resized_images if resized_images else None,
+            images=resized_images,
             image_context=image_context,
             persona_id=persona_id,
             force_image_generation=force_image_generation,
         ):
-            yield "data: " + json.dumps(event) + "\n\n"
-
-    return Response(
-        generate(),
-        mimetype="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        },
-    )
+            yield _SSE_PREFIX + _dumps_bytes(event) + _SSE_SUFFIX
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        "Vary": "Accept-Encoding",
+    }
+    body = generate()
+    # Token frames repeat the same JSON keys, so they compress well; the browser's fetch decodes gzip transparently
+    if _accepts_gzip():
+        headers["Content-Encoding"] = "gzip"
+        body = _gzip_stream(body)
+    return Response(body, mimetype="text/event-stream", headers=headers)
 
 
 if __name__ == "__main__":
     _request_stay_awake()
+    _exit_on_sigterm()
     port = 5000
     # host="0.0.0.0" makes the server reachable from other devices on your network
     urls = _local_network_urls(port)
@@ -211,4 +261,15 @@ if __name__ == "__main__":
         print("On other devices, use one of:")
         for url in urls:
             print(f"  {url}")
-    app.run(host="0.0.0.0", port=port, debug=True)
+    # --dev: Flask's dev server with the debugger and reloader. Otherwise serve with waitress, whose thread
+    # pool lets several /chat/stream requests wait on Ollama at once; fall back to the threaded dev server without it.
+    if "--dev" in sys.argv[1:]:
+        app.run(host="0.0.0.0", port=port, debug=True, threaded=True)
+    else:
+        try:
+            from waitress import serve
+        except ImportError:
+            print("waitress is not installed; using Flask's threaded server (pip install waitress)")
+            app.run(host="0.0.0.0", port=port, threaded=True)
+        else:
+            serve(app, host="0.0.0.0", port=port, threads=8, connection_limit=200)
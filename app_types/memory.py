@@ -2,8 +2,20 @@
 
 from dataclasses import dataclass, field
 
+# Fields that build_prompt reads; changing any other field (timestamp, sources, image path) keeps the memoized lines
+_PROMPT_FIELDS = frozenset(
+    ("role", "content", "persona_name", "image_context", "web_context", "generated_image_prompt", "summarized_content")
+)
+# Fields that to_dict writes; changing any of them drops the memoized file encoding
+_PERSISTED_FIELDS = frozenset(
+    (
+        "timestamp", "role", "content", "persona_name", "image_context", "sources",
+        "generated_image_path", "generated_image_prompt", "summarized_content",
+    )
+)
 
-@dataclass
+
+@dataclass(slots=True)
 class MemoryEntry:
     """
     One message in short-term conversation memory.
@@ -20,6 +32,17 @@ class MemoryEntry:
     generated_image_path: str | None = None  # e.g. /static/generated/xxx.png, assistant only; UI only, not sent to LLM
     generated_image_prompt: str | None = None  # prompt used to generate the image (assistant only); optional in LLM context
     summarized_content: str | None = None  # optional summary of content; used in prompts when present
+    _prompt_cache: dict = field(default_factory=dict, init=False, repr=False, compare=False)  # build_prompt results by flags
+    _encoded: bytes | None = field(default=None, init=False, repr=False, compare=False)  # memory.py's JSON for this entry
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)  # not super(): the slots class is a rebuilt copy
+        if name in _PROMPT_FIELDS:
+            cache = getattr(self, "_prompt_cache", None)  # not yet set while __init__ runs
+            if cache:
+                cache.clear()
+        if name in _PERSISTED_FIELDS:
+            object.__setattr__(self, "_encoded", None)
 
     @classmethod
     def from_dict(cls, d: dict) -> "MemoryEntry":
@@ -31,7 +54,7 @@ class MemoryEntry:
             content=d.get("content", ""),
             image_context=d.get("image_context"),
             web_context=None,  # not persisted
-            sources=list(d.get("sources") or []),
+            sources=list(d.get("sources") or ()),
             generated_image_path=d.get("generated_image_path"),
             generated_image_prompt=d.get("generated_image_prompt"),
             summarized_content=d.get("summarized_content"),
@@ -62,7 +85,11 @@ class MemoryEntry:
         include_image_context: bool = True,
         include_generated_image_prompt: bool = True,
     ) -> str:
-        """Format this entry for inclusion in the LLM prompt. Omits sources, generated_image_path. Uses summarized_content when present."""
+        """Format this entry for inclusion in the LLM prompt. Omits sources, generated_image_path. Uses summarized_content when present. Memoized per flag combination."""
+        key = (include_image_context, include_generated_image_prompt)
+        cached = self._prompt_cache.get(key)
+        if cached is not None:
+            return cached
         text = self.summarized_content if self.summarized_content else self.content
         line = f"{self.persona_name if self.role == 'assistant' else self.role}: {text}"
         if self.image_context and include_image_context:
@@ -71,6 +98,7 @@ class MemoryEntry:
             line += f"\n[web context: {self.web_context}]"
         if self.generated_image_prompt and include_generated_image_prompt:
             line += f"\n[generated image prompt: {self.generated_image_prompt}]"
+        self._prompt_cache[key] = line
         return line
 
 
@@ -78,7 +106,7 @@ class MemoryEntries:
     """Container for a list of MemoryEntry; load/save via memory.load_memory / save_memory."""
 
     def __init__(self, entries: list[MemoryEntry] | None = None):
-        self.entries: list[MemoryEntry] = list(entries or [])
+        self.entries: list[MemoryEntry] = list(entries or ())
 
     def build_prompt(
         self,
@@ -90,6 +118,14 @@ class MemoryEntries:
             for entry in self.entries
         )
 
+    def index_of(self, timestamp: str) -> int:
+        """Index of the newest entry with this timestamp, or -1. Scans from the end: updates target recent entries."""
+        entries = self.entries
+        for i in range(len(entries) - 1, -1, -1):
+            if entries[i].timestamp == timestamp:
+                return i
+        return -1
+
     def to_dict_list(self) -> list[dict]:
         """List of dicts for JSON serialization."""
         return [e.to_dict() for e in self.entries]
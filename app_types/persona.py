@@ -10,7 +10,8 @@ class Decisions:
     """
     Per-persona toggles for LLM-based decisions (each runs once per turn).
     Built from config dict: { "image_generation": true, "web_search": true, "prior_image_context": true }.
-    Missing keys default to True (enabled).
+    Missing keys default to True (enabled), except decide_prior_image_context: it is opt-in, and when set each turn
+    asks the decision model whether the included prior image context is needed.
     """
 
     def __init__(self, config: dict | None = None):
@@ -18,6 +19,7 @@ class Decisions:
         self.image_generation = config.get("image_generation", True)
         self.web_search = config.get("web_search", True)
         self.prior_image_context = config.get("prior_image_context", True)
+        self.decide_prior_image_context = config.get("decide_prior_image_context", False)
 
     def get(self, key: str, default: bool = True) -> bool:
         """Dict-like get for compatibility; unknown keys default to True (enabled)."""
@@ -1,3 +1,13 @@
+import io
+
+DEFAULT_SYSTEM_PERSONA = "You are a helpful AI assistant. You remain accurate, concise, and calm."
+_WEB_CONTEXT_INSTRUCTIONS = (
+    "Use the following web information to answer the question. "
+    "Base your answer on this information unless the prompt includes an image, then also use the image context.\n\n"
+    "Web information:\n"
+)
+
+
 class Prompt:
     def __init__(
         self,
@@ -15,19 +25,29 @@ class Prompt:
         self.include_memory_image_context = True
         self.include_generated_image_prompt = True
 
-    def build(self) -> str:
-        default_system = "You are a helpful AI assistant. You remain accurate, concise, and calm."
-        parts = []
-        parts.append(self.system_persona or default_system)
+    def _write_prefix(self, out: io.StringIO) -> None:
+        out.write(self.system_persona or DEFAULT_SYSTEM_PERSONA)
         if self.memory_entries:
-            parts.append(f"Conversation memory:\n{self.memory_entries.build_prompt(self.include_memory_image_context, self.include_generated_image_prompt)}\n")
+            out.write("\nConversation memory:\n")
+            out.write(self.memory_entries.build_prompt(self.include_memory_image_context, self.include_generated_image_prompt))
+            out.write("\n")
+
+    def _write_tail(self, out: io.StringIO) -> None:
         if self.extra_context:
-            parts.append(f"Additional context:\n{self.extra_context}\n")
+            out.write("Additional context:\n")
+            out.write(self.extra_context)
+            out.write("\n\n")
         if self.web_context:
-            parts.append(
-                "Use the following web information to answer the question. "
-                "Base your answer on this information unless the prompt includes an image, then also use the image context.\n\n"
-                f"Web information:\n{self.web_context}\n"
-            )
-        parts.append(f"Question:\n{self.question}")
-        return "\n".join(parts)
+            out.write(_WEB_CONTEXT_INSTRUCTIONS)
+            out.write(self.web_context)
+            out.write("\n\n")
+        out.write("Question:\n")
+        out.write(self.question)
+
+    def build(self) -> str:
+        """Full prompt. The stable prefix comes first so Ollama can reuse its cached KV state for it."""
+        out = io.StringIO()
+        self._write_prefix(out)
+        out.write("\n")
+        self._write_tail(out)
+        return out.getvalue()
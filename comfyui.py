@@ -4,18 +4,44 @@ Calls a local ComfyUI server (default http://127.0.0.1:8188) to generate an imag
 Uses the default ComfyUI workflow: UNETLoader + CLIPLoader + VAE -> KSampler -> VAEDecode -> SaveImage.
 
 The server must already be running. If it is not reachable, image generation returns an error.
+Completion is detected from ComfyUI's WebSocket events when websocket-client is installed,
+otherwise by polling /history.
 Optional config from .env: COMFYUI_URL, COMFYUI_DEBUG.
 """
-import base64
+import functools
 import json
 import os
+import shutil
 import sys
 import time
-import urllib.error
 import urllib.parse
-import urllib.request
+import uuid
+from contextlib import nullcontext
 from pathlib import Path
 
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import pybase64 as base64  # SIMD base64, same API as the stdlib module
+except ImportError:
+    import base64
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps_bytes = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps_bytes(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+try:
+    import websocket  # websocket-client: completion events instead of polling /history
+except ImportError:
+    websocket = None
+
 WIDTH, HEIGHT = 1024, 1024 # image size (must be divisible by pipeline's vae_scale_factor * 2)
 
 # Load .env from project root so COMFYUI_URL etc. can be set without exporting in the shell
@@ -32,8 +58,15 @@ DEBUG = os.environ.get("COMFYUI_DEBUG", "").strip() in ("1", "true", "yes")
 
 # Server URL (set COMFYUI_URL in .env to override). Model names from persona config or env.
 COMFYUI_URL = os.environ.get("COMFYUI_URL", "http://127.0.0.1:8188").rstrip("/")
-POLL_INTERVAL = float(os.environ.get("COMFYUI_POLL_INTERVAL", "0.5"))
+POLL_INTERVAL = float(os.environ.get("COMFYUI_POLL_INTERVAL", "0.5"))  # longest wait between /history polls
+POLL_START_INTERVAL = 0.05  # first wait; grows by 1.5x per poll up to POLL_INTERVAL
 MAX_WAIT_SECONDS = float(os.environ.get("COMFYUI_MAX_WAIT", "520"))
+# ComfyUI's --output-directory, when it is on this machine: finished images are moved from there instead of fetched over HTTP
+COMFYUI_OUTPUT_DIR = os.environ.get("COMFYUI_OUTPUT_DIR", "").strip()
+
+# One keep-alive session for all ComfyUI calls, so the queue POST, every history poll and the image fetch reuse a socket
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
 
 # Default model names when no persona comfyui config (env or these fallbacks)
 _DEFAULT_DIFFUSION = os.environ.get("DIFFUSION_MODEL_NAME", "z-image-turbo-fp8-e4m3fn.safetensors")
@@ -98,6 +131,22 @@ def _build_workflow_z_image(
         }
     }
 
+
+@functools.lru_cache(maxsize=16)
+def _workflow_template(diffusion_name: str, clip_name: str, vae_name: str, width: int, height: int) -> dict:
+    """Cached z-image workflow for one model set and size. Shared between calls: never mutate it, use _workflow_for."""
+    return _build_workflow_z_image(diffusion_name, clip_name, vae_name, width=width, height=height)
+
+
+def _workflow_for(template: dict, prompt: str, seed: int, filename_prefix: str) -> dict:
+    """Copy a cached workflow, replacing only the per-image nodes: prompt (5), seed (7) and save prefix (9)."""
+    workflow = dict(template)
+    for node_id, key, value in (("5", "text", prompt), ("7", "seed", seed), ("9", "filename_prefix", filename_prefix)):
+        node = template[node_id]
+        workflow[node_id] = {**node, "inputs": {**node["inputs"], key: value}}
+    return workflow
+
+
 def _build_workflow_sdxl(
     diffusion_name: str,
     clip_name: str,
@@ -173,9 +222,8 @@ def _build_workflow_sdxl(
 def _is_comfyui_running(timeout: float = 2.0) -> bool:
     """Return True if the ComfyUI server responds."""
     try:
-        req = urllib.request.Request(f"{COMFYUI_URL}/system_stats", method="GET")
-        with urllib.request.urlopen(req, timeout=timeout) as _:
-            return True
+        with _session.get(f"{COMFYUI_URL}/system_stats", timeout=timeout) as resp:
+            return resp.ok
     except Exception:
         return False
 
@@ -198,34 +246,31 @@ def is_comfyui_running() -> bool:
 def _request(method: str, path: str, data: dict | None = None, timeout: int = 60) -> dict | None:
     """Send one HTTP request and wait for the full response (blocking)."""
     url = f"{COMFYUI_URL}{path}"
+    headers = None
+    body = None
     if data is not None:
-        body = json.dumps(data).encode("utf-8")
-        req = urllib.request.Request(url, data=body, method=method)
-        req.add_header("Content-Type", "application/json")
-    else:
-        req = urllib.request.Request(url, method=method)
+        body = _json_dumps_bytes(data)
+        headers = {"Content-Type": "application/json"}
     try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            return json.loads(resp.read().decode())
-    except urllib.error.HTTPError as e:
-        body = ""
-        try:
-            body = e.read().decode("utf-8", errors="replace")
-        except Exception:
-            pass
-        msg = f"ComfyUI request failed: HTTP {e.code} {e.reason}"
-        if body:
-            msg += f"\nResponse: {body[:2000]}"
+        resp = _session.request(method, url, data=body, headers=headers, timeout=timeout)
+    except requests.RequestException as e:
+        raise RuntimeError(f"ComfyUI request failed: {e}") from e
+    if not resp.ok:
+        msg = f"ComfyUI request failed: HTTP {resp.status_code} {resp.reason}"
+        if resp.text:
+            msg += f"\nResponse: {resp.text[:2000]}"
         if DEBUG and data is not None:
             msg += f"\nRequest body (first 2000 chars): {json.dumps(data)[:2000]}"
-        raise RuntimeError(msg) from e
-    except urllib.error.URLError as e:
-        raise RuntimeError(f"ComfyUI request failed: {e}") from e
+        raise RuntimeError(msg)
+    return _json_loads(resp.content)
 
 
-def _queue_prompt(prompt: dict) -> str:
-    """Submit the workflow to ComfyUI. Returns prompt_id."""
-    out = _request("POST", "/prompt", data={"prompt": prompt}, timeout=30)
+def _queue_prompt(prompt: dict, client_id: str | None = None) -> str:
+    """Submit the workflow to ComfyUI. Returns prompt_id. client_id routes progress events to that WebSocket client."""
+    data = {"prompt": prompt}
+    if client_id:
+        data["client_id"] = client_id
+    out = _request("POST", "/prompt", data=data, timeout=30)
     if out is None:
         raise RuntimeError("ComfyUI returned no response")
     if "error" in out:
@@ -248,22 +293,100 @@ def _get_output_image(prompt_id: str, history: dict) -> dict | None:
     """Extract first output image from SaveImage node (9). Returns image dict (filename, type, subfolder) or None."""
     outputs = history.get("outputs") or {}
     node9 = outputs.get("9") or {}
-    images = node9.get("images") or []
+    images = node9.get("images")
     if not images:
         return None
     return images[0]
 
 
-def _fetch_image_bytes(filename: str, type_dir: str = "output", subfolder: str = "") -> bytes:
-    """GET /view to retrieve image bytes."""
+def _websocket_url(client_id: str) -> str | None:
+    """ComfyUI's /ws URL for client_id, derived from COMFYUI_URL (http -> ws, https -> wss). None for other schemes."""
+    parts = urllib.parse.urlsplit(COMFYUI_URL)
+    scheme = {"http": "ws", "https": "wss"}.get(parts.scheme.lower())
+    if scheme is None or not parts.netloc:
+        return None
+    query = urllib.parse.urlencode({"clientId": client_id})
+    return urllib.parse.urlunsplit((scheme, parts.netloc, parts.path.rstrip("/") + "/ws", query, ""))
+
+
+def _open_websocket(client_id: str):
+    """Connect to ComfyUI's /ws event stream for client_id. Returns None if websocket-client is missing or it fails."""
+    url = _websocket_url(client_id)
+    if websocket is None or url is None:
+        return None
+    try:
+        return websocket.create_connection(url, timeout=10)
+    except Exception:
+        return None
+
+
+def _wait_via_websocket(ws, prompt_id: str, deadline: float) -> dict | None:
+    """
+    Block on ComfyUI events until the SaveImage node (9) of prompt_id has executed. Returns its image dict.
+    Returns None if the socket fails, the deadline passes, or the prompt finished without an executed event
+    (e.g. cached output); the caller then falls back to /history. Raises RuntimeError if execution failed.
+    """
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            ws.settimeout(remaining)
+            message = ws.recv()
+            if not isinstance(message, str):
+                continue  # binary preview frames
+            msg = _json_loads(message)
+            data = msg.get("data") or {}
+            if data.get("prompt_id") != prompt_id:
+                continue
+            kind = msg.get("type")
+            if kind == "executed" and data.get("node") == "9":
+                images = (data.get("output") or {}).get("images")
+                return images[0] if images else None
+            if kind == "execution_error":
+                raise RuntimeError(f"ComfyUI error: {data.get('exception_message') or 'execution failed'}")
+            if kind == "executing" and data.get("node") is None:
+                return None  # prompt finished
+    except RuntimeError:
+        raise
+    except Exception:
+        return None
+
+
+def _local_output_path(filename: str, type_dir: str = "output", subfolder: str = "") -> Path | None:
+    """Path of a ComfyUI output file in COMFYUI_OUTPUT_DIR, or None if that isn't configured or the file isn't there."""
+    if not COMFYUI_OUTPUT_DIR or type_dir != "output" or not filename:
+        return None
+    path = Path(COMFYUI_OUTPUT_DIR) / subfolder / filename
+    return path if path.is_file() else None
+
+
+FETCH_CHUNK_SIZE = 65535  # multiple of 3, so each chunk base64-encodes without padding
+
+
+def _fetch_image_base64(filename: str, type_dir: str = "output", subfolder: str = "", out_path: Path | None = None) -> str:
+    """
+    GET /view and return the image as base64, encoding it chunk by chunk as it streams in.
+    If out_path is given, the raw bytes are written there at the same time; the full raw image is never held in memory.
+    """
     params = {"filename": filename, "type": type_dir}
     if subfolder:
         params["subfolder"] = subfolder
     q = "&".join(f"{k}={urllib.parse.quote(str(v))}" for k, v in params.items())
-    url = f"{COMFYUI_URL}/view?{q}"
-    req = urllib.request.Request(url, method="GET")
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        return resp.read()
+    encoded = bytearray()
+    pending = b""
+    with _session.get(f"{COMFYUI_URL}/view?{q}", timeout=30, stream=True) as resp:
+        resp.raise_for_status()
+        with open(out_path, "wb") if out_path else nullcontext() as out:
+            for chunk in resp.iter_content(FETCH_CHUNK_SIZE):
+                if out is not None:
+                    out.write(chunk)
+                pending += chunk
+                aligned = len(pending) - len(pending) % 3
+                encoded += base64.b64encode(pending[:aligned])
+                pending = pending[aligned:]
+    encoded += base64.b64encode(pending)
+    return encoded.decode("ascii")
 
 
 def generate_image(
@@ -272,6 +395,7 @@ def generate_image(
     height: int = HEIGHT,
     width: int = WIDTH,
     comfyui_config: dict | None = None,
+    include_base64: bool = True,
 ) -> dict:
     """
     Generate an image from a text prompt using a local ComfyUI server.
@@ -287,11 +411,12 @@ def generate_image(
         height, width: Output size passed to the EmptyLatentImage node in the workflow.
         comfyui_config: Optional dict from persona config with keys models_dir, diffusion_model_name,
             clip_model_name, vae_model_name. If None, env vars or defaults are used.
+        include_base64: Set False when only the saved file is needed; with COMFYUI_OUTPUT_DIR set and
+            a save_path, the image is then moved into place without being fetched or encoded.
 
     Returns:
-        dict with status "ok" (queued) or "error". Fire-and-forget: we only wait for the
-        server to accept the job (one POST); ComfyUI writes the image to save_path when done.
-        No polling or image fetch. Keys: status, prompt, prompt_id (when ok), error (when error).
+        dict with status "ok" or "error". Keys: status, prompt, and when ok filename, image_path (when
+        save_path was given) and image_base64 (when include_base64); error when status is "error".
     """
     if not prompt or not prompt.strip():
         return {"status": "error", "prompt": prompt, "error": "Empty prompt"}
@@ -303,54 +428,83 @@ def generate_image(
 
     try:
         _require_comfyui_running()
-        workflow = _build_workflow_z_image(diffusion_name, clip_name, vae_name, save_path=save_path, width=width, height=height)
-        workflow["5"]["inputs"]["text"] = prompt.strip()  # positive prompt = node 5
-        workflow["7"]["inputs"]["seed"] = int(time.time() * 1000) % (2**32)
+        workflow = _workflow_for(
+            _workflow_template(diffusion_name, clip_name, vae_name, width, height),
+            prompt.strip(),  # positive prompt = node 5
+            int(time.time() * 1000) % (2**32),
+            _save_path_to_filename_prefix(save_path),
+        )
 
         if DEBUG:
             print("COMFYUI_DEBUG: workflow being sent:", json.dumps(workflow, indent=2), file=sys.stderr)
 
-        prompt_id = _queue_prompt(workflow)
-        
-        deadline = time.monotonic() + MAX_WAIT_SECONDS
-        while time.monotonic() < deadline:
-            time.sleep(POLL_INTERVAL)
+        # Subscribe to completion events before queueing so the SaveImage event can't be missed
+        client_id = uuid.uuid4().hex
+        ws = _open_websocket(client_id)
+        img_info = None
+        try:
+            prompt_id = _queue_prompt(workflow, client_id=client_id)
+            deadline = time.monotonic() + MAX_WAIT_SECONDS
+            if ws is not None:
+                img_info = _wait_via_websocket(ws, prompt_id, deadline)
+        finally:
+            if ws is not None:
+                ws.close()
+
+        # Poll /history without websocket-client, if the socket failed, or to pick up cached output.
+        # The delay starts short so quick generations are noticed quickly, then backs off to POLL_INTERVAL.
+        delay = min(POLL_START_INTERVAL, POLL_INTERVAL)
+        while img_info is None and time.monotonic() < deadline:
             history = _get_history(prompt_id)
-            if history is None:
-                continue
-            if "status" in history and history.get("status") == "error":
-                return {
-                    "status": "error",
-                    "prompt": prompt,
-                    "error": history.get("status_messages", ["Unknown error"]) or "ComfyUI reported an error",
-                }
-            img_info = _get_output_image(prompt_id, history)
-            if img_info:
-                comfy_filename = img_info.get("filename", "")
-                type_dir = img_info.get("type", "output")
-                subfolder_str = img_info.get("subfolder", "")
-                b = _fetch_image_bytes(comfy_filename, type_dir=type_dir, subfolder=subfolder_str)
-                if save_path and save_path.strip():
-                    out_path = Path(save_path.strip())
-                    out_path.parent.mkdir(parents=True, exist_ok=True)
-                    # Remove ComfyUI's file with the wrong name if it's under the same output dir
-                    (out_path.parent / comfy_filename).unlink(missing_ok=True)
-                    if subfolder_str:
-                        (out_path.parent / subfolder_str / comfy_filename).unlink(missing_ok=True)
-                    out_path.write_bytes(b)
-                b64 = base64.b64encode(b).decode("ascii")
-                output_filename = _save_path_to_output_filename(save_path)
-                return {
-                    "status": "ok",
-                    "prompt": prompt,
-                    "image_base64": b64,
-                    "filename": output_filename,
-                }
-        return {
-            "status": "error",
+            if history is not None:
+                if "status" in history and history.get("status") == "error":
+                    return {
+                        "status": "error",
+                        "prompt": prompt,
+                        "error": history.get("status_messages", ["Unknown error"]) or "ComfyUI reported an error",
+                    }
+                img_info = _get_output_image(prompt_id, history)
+            if img_info is None:
+                time.sleep(delay)
+                delay = min(delay * 1.5, POLL_INTERVAL)
+        if img_info is None:
+            return {
+                "status": "error",
+                "prompt": prompt,
+                "error": "ComfyUI did not finish within the timeout",
+            }
+
+        comfy_filename = img_info.get("filename", "")
+        type_dir = img_info.get("type", "output")
+        subfolder_str = img_info.get("subfolder", "")
+        out_path = None
+        if save_path and save_path.strip():
+            out_path = Path(save_path.strip())
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+        local_path = _local_output_path(comfy_filename, type_dir=type_dir, subfolder=subfolder_str)
+        b64 = None
+        if out_path is not None and local_path is not None:
+            # ComfyUI wrote the file on this machine: rename it into place instead of copying it through HTTP
+            shutil.move(local_path, out_path)
+            if include_base64:
+                b64 = base64.b64encode(out_path.read_bytes()).decode("ascii")
+        else:
+            b64 = _fetch_image_base64(comfy_filename, type_dir=type_dir, subfolder=subfolder_str, out_path=out_path)
+        if out_path is not None:
+            # Remove ComfyUI's file with the wrong name if it's under the same output dir
+            for comfy_path in (out_path.parent / comfy_filename, out_path.parent / subfolder_str / comfy_filename):
+                if comfy_path != out_path:
+                    comfy_path.unlink(missing_ok=True)
+        result = {
+            "status": "ok",
             "prompt": prompt,
-            "error": "ComfyUI did not finish within the timeout",
+            "filename": _save_path_to_output_filename(save_path),
         }
+        if include_base64:
+            result["image_base64"] = b64
+        if out_path is not None:
+            result["image_path"] = str(out_path)
+        return result
     except Exception as e:
         return {
             "status": "error",
@@ -1,11 +1,19 @@
 """
 Image context: resize images for the LLM and encode them as text summaries via a vision model.
 """
-import base64
 import io
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pybase64 as base64  # SIMD base64, same API as the stdlib module
+except ImportError:
+    import base64
 
 # Max dimension (width or height) for images sent to Ollama; larger images are scaled down.
 IMAGE_MAX_SIZE = 512
+# Most vision-model calls in flight for one request's images; the rest queue, however many images are attached
+MAX_IMAGE_CONTEXT_WORKERS = 4
 
 IMAGE_CONTEXT_PROMPT = """You are a visual memory encoder.
 Summarize this image into compact semantic memory suitable for future AI context.
@@ -15,6 +23,35 @@ If the image contains a recognizable person, include their name and any other re
 Keep it under 150 tokens."""
 
 
+# Base64 prefix decoded to read dimensions from the header (multiple of 4; 64 KiB covers typical EXIF blocks)
+_PROBE_B64_CHARS = 4 * 16384
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _probe_image_size(head: bytes) -> tuple[int, int] | None:
+    """Return (width, height) from a PNG IHDR or JPEG SOF header in head, or None if it isn't found there."""
+    if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+        return struct.unpack(">II", head[16:24])
+    if head[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 <= len(head):
+        if head[i] != 0xFF:
+            return None
+        marker = head[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # markers without a length
+            i += 2
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", head[i + 5 : i + 9])
+            return (width, height)
+        i += 2 + struct.unpack(">H", head[i + 2 : i + 4])[0]
+    return None
+
+
 def resize_image_for_llm(image_base64: str, max_size: int = IMAGE_MAX_SIZE) -> str:
     """
     Scale down an image so the longest side is at most max_size pixels.
@@ -30,16 +67,25 @@ def resize_image_for_llm(image_base64: str, max_size: int = IMAGE_MAX_SIZE) -> s
         idx = raw.find(",")
         if idx != -1:
             raw = raw[idx + 1 :]
-    raw = raw.replace("\n", "").replace("\r", "")
+    # Line breaks would throw off the padding and probe offsets; browser data URLs have none, so only scan for them
+    if "\n" in raw or "\r" in raw:
+        raw = raw.replace("\n", "").replace("\r", "")
     try:
         pad = (4 - len(raw) % 4) % 4
         if pad:
             raw += "=" * pad
+        # Small images are returned as-is: read their size from the header before decoding the whole payload
+        size = _probe_image_size(base64.b64decode(raw[:_PROBE_B64_CHARS], validate=False))
+        if size and max(size) <= max_size:
+            return image_base64
         decoded = base64.b64decode(raw, validate=False)
+        # Image.open only parses the header; decode pixels only when the image actually needs scaling
         img = Image.open(io.BytesIO(decoded))
-        img.load()
         if max(img.size) <= max_size:
             return image_base64
+        # JPEGs: let libjpeg-turbo (bundled with Pillow) downscale in the DCT while decoding, to no less than max_size
+        img.draft(img.mode, (max_size, max_size))
+        img.load()
         try:
             resample = Image.Resampling.LANCZOS
         except AttributeError:
@@ -74,9 +120,16 @@ def image_context_for_images(images: list) -> str | None:
     """
     if not images:
         return None
+    if len(images) == 1:
+        summaries = [image_context_for_image(images[0])]
+    else:
+        # Ollama serves concurrent requests, so describe several images at once. A pool of their own keeps these slow
+        # vision calls from queueing ahead of other turns' work on agent_core's shared pool.
+        workers = min(len(images), MAX_IMAGE_CONTEXT_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-context") as pool:
+            summaries = list(pool.map(image_context_for_image, images))
     parts = []
-    for i, img in enumerate(images, 1):
-        summary = image_context_for_image(img)
+    for i, summary in enumerate(summaries, 1):
         if summary:
             parts.append(f"Image {i}: {summary.strip()}")
     return "\n".join(parts) if parts else None
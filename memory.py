@@ -1,71 +1,150 @@
+import asyncio
+import atexit
 import json
 import os
+import re
+import sys
+import tempfile
 import threading
+import time
+from itertools import islice
 from pathlib import Path
 
-from datetime import datetime, timezone
-
 from app_types.memory import MemoryEntries, MemoryEntry
 from personas import PERSONAS_DIR
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+
+    def _dumps_entry(d: dict) -> bytes:
+        return orjson.dumps(d, option=orjson.OPT_INDENT_2)
+except ImportError:
+    _json_loads = json.loads
+
+    def _dumps_entry(d: dict) -> bytes:
+        return json.dumps(d, indent=2).encode("utf-8")
+
 MEMORY_FILE = "memory.json"
 _ROOT = Path(__file__).resolve().parent
 
 # Serialize all file access so concurrent web requests don't corrupt or lose updates.
 _memory_lock = threading.Lock()
-# Max total character size of the memory JSON file. Oldest entries are removed until the file fits.
+# Max size of the memory JSON file in bytes as written (characters with the ASCII-only stdlib encoder).
+# Oldest entries are removed until the file fits.
 MAX_MEMORY_CHARS = 50_000
 MAX_ITEM_CHARS = 1000
 MAX_IMAGE_CONTEXT_CHARS = 2000
 MAX_SOURCES = 20
 MAX_SOURCE_URL_CHARS = 500
+# Generated persona images: /personas/<persona_id>/images/<filename>
+_PERSONA_IMAGE_URL_RE = re.compile(r"/personas/([^/\\]+)/images/([^/\\]+)")
+# Parsed entries per memory file -> ((mtime_ns, size, inode), entries), refreshed on every load and write from this
+# module. Loads reuse it while the file signature matches, so re-reading after our own writes costs no JSON parse.
+_recent_cache: dict[str, tuple[tuple[int, int, int], MemoryEntries]] = {}
+# Write-behind: saves only record the new entries here; the flush thread writes each file at most once per
+# WRITE_DELAY_SECONDS, so bursts of updates cost one write. Loads see pending entries before the file.
+# Durability window: a save reaches disk up to WRITE_DELAY_SECONDS after it returns. A normal exit (atexit), and
+# SIGTERM / CTRL_BREAK_EVENT when app.py is run directly, write pending saves first; a hard kill loses them.
+WRITE_DELAY_SECONDS = 0.2
+# After a failed write the entries stay pending and are retried this much later
+WRITE_RETRY_SECONDS = 2.0
+_pending_writes: dict[str, MemoryEntries] = {}
+_flush_event = threading.Event()
+
+
+def _file_signature(path: str) -> tuple[int, int, int] | None:
+    """
+    Return (mtime_ns, size, inode) for path, or None if it cannot be read. The inode catches files replaced
+    by rename (our own saves, most editors) even when the filesystem's mtime is too coarse to change.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+_last_timestamp_us = 0
+# (unix second, "YYYY-MM-DDTHH:MM:SS") of the last timestamp; entries in the same second reuse the formatted prefix
+_timestamp_prefix: tuple[int, str] = (-1, "")
+
+
+def _new_timestamp() -> str:
+    """
+    UTC ISO timestamp for a new entry, in datetime.isoformat() form with microseconds. Timestamps identify entries
+    (update/delete), so they strictly increase, even within one microsecond or after the clock steps back.
+    Caller must hold _memory_lock.
+    """
+    global _last_timestamp_us, _timestamp_prefix
+    us = max(time.time_ns() // 1000, _last_timestamp_us + 1)
+    _last_timestamp_us = us
+    sec, frac = divmod(us, 1_000_000)
+    if _timestamp_prefix[0] != sec:
+        _timestamp_prefix = (sec, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec)))
+    return f"{_timestamp_prefix[1]}.{frac:06d}+00:00"
 
 
 def _cap_content(content: str, max_len: int = MAX_ITEM_CHARS) -> str:
     """Truncate content to a reasonable length to avoid overloading the prompt."""
-    if not content or len(content) <= max_len:
-        return content or ""
+    if content is None:
+        return ""
+    if len(content) <= max_len:
+        return content
     return content[: max_len - 3].rstrip() + "..."
 
 
+def _generated_image_fs_path(url_path: str | None) -> str | None:
+    """Map a generated-image URL (/personas/<id>/images/<filename>) to its file path, or None if it isn't one."""
+    if not url_path:
+        return None
+    m = _PERSONA_IMAGE_URL_RE.fullmatch(url_path.strip())
+    if not m:
+        return None
+    id_part, filename = m.groups()
+    if ".." in id_part or ".." in filename:
+        return None
+    return os.path.join(PERSONAS_DIR, id_part, "images", filename)
+
+
 def _delete_generated_image_file(url_path: str | None) -> None:
-    """
-    If url_path is a known generated-image URL, delete the corresponding file from disk.
-    Supports /personas/<id>/images/<filename> and legacy /static/generated/<filename>.
-    """
-    if not url_path or not url_path.startswith("/"):
-        return
-    url_path = url_path.strip()
-    # Persona images: /personas/<persona_id>/images/<filename>
-    if url_path.startswith("/personas/") and "/images/" in url_path:
-        prefix = "/personas/"
-        suffix = "/images/"
+    """If url_path is a known generated-image URL, delete the corresponding file from disk."""
+    fs_path = _generated_image_fs_path(url_path)
+    if fs_path:
         try:
-            after_prefix = url_path[len(prefix) :]
-            id_part, filename = after_prefix.split(suffix, 1)
-            if ".." in filename or "/" in filename or "\\" in filename or not filename:
-                return
-            fs_path = os.path.join(PERSONAS_DIR, id_part, "images", filename)
-            if os.path.isfile(fs_path):
-                os.remove(fs_path)
-        except (ValueError, OSError):
+            os.unlink(fs_path)
+        except OSError:  # already gone (or not a regular file)
             pass
-        return
 
 
 def _load_memory_unlocked(memory_file: str | None = None) -> MemoryEntries:
-    """Load memory file without acquiring lock. Caller must hold _memory_lock."""
+    """
+    Load memory file without acquiring lock. Caller must hold _memory_lock.
+    Returns a new MemoryEntries list; the entry objects are shared with _recent_cache while the file is unchanged.
+    """
     path = memory_file or MEMORY_FILE
+    # MemoryEntries copies the list it is given, so each return is a snapshot without copying any entry
+    pending = _pending_writes.get(path)
+    if pending is not None:
+        return MemoryEntries(pending.entries)
+    signature = _file_signature(path)
+    cached = _recent_cache.get(path)
+    if signature is not None and cached and cached[0] == signature:
+        return MemoryEntries(cached[1].entries)
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            raw = json.load(f)
+        with open(path, "rb") as f:
+            raw = _json_loads(f.read())
     except FileNotFoundError:
         return MemoryEntries()
     if isinstance(raw, list):
-        return MemoryEntries.from_dict_list(raw)
-    if isinstance(raw, dict) and "entries" in raw:
-        return MemoryEntries.from_dict_list(raw["entries"])
-    return MemoryEntries()
+        entries = MemoryEntries.from_dict_list(raw)
+    elif isinstance(raw, dict) and "entries" in raw:
+        entries = MemoryEntries.from_dict_list(raw["entries"])
+    else:
+        entries = MemoryEntries()
+    if signature is not None:
+        _recent_cache[path] = (signature, MemoryEntries(entries.entries))
+    return entries
 
 
 def load_memory(memory_file: str | None = None) -> MemoryEntries:
@@ -78,51 +157,126 @@ def load_memory(memory_file: str | None = None) -> MemoryEntries:
         return _load_memory_unlocked(memory_file)
 
 
-def _save_memory_unlocked(entries: MemoryEntries, memory_file: str | None = None) -> None:
-    """Write memory to file without acquiring lock. Caller must hold _memory_lock."""
-    path = memory_file or MEMORY_FILE
-    out = MemoryEntries(list(entries.entries))
-    while len(out.entries) > 1:
-        payload = out.to_dict_list()
-        if len(json.dumps({"entries": payload}, indent=2)) <= MAX_MEMORY_CHARS:
+def _write_atomic(path: str, data: bytes) -> None:
+    """
+    Write data to a temp file next to path, then rename it over path, so readers never see a partial file.
+    The data is fsynced before the rename so a crash or power loss leaves either the old or the new file.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+# Layout of json.dump({"entries": [...]}, indent=2), assembled from entries that are each serialized once
+_ENTRIES_HEAD = b'{\n  "entries": [\n    '
+_ENTRIES_SEP = b",\n    "
+_ENTRIES_TAIL = b"\n  ]\n}"
+_EMPTY_ENTRIES = b'{\n  "entries": []\n}'
+
+
+def _write_memory_unlocked(path: str, entries: MemoryEntries) -> None:
+    """Trim and write entries to path now. Caller must hold _memory_lock."""
+    # Serialize newest first (indented as it sits in the file) and stop at the first entry that no longer fits:
+    # the newest entry is always kept, and older entries that will be trimmed are never serialized.
+    # Each entry keeps its encoding until a persisted field changes, so unchanged entries are not re-serialized.
+    encoded: list[bytes] = []
+    total = len(_ENTRIES_HEAD) + len(_ENTRIES_TAIL) - len(_ENTRIES_SEP)
+    for e in reversed(entries.entries):
+        item = e._encoded
+        if item is None:
+            item = e._encoded = _dumps_entry(e.to_dict()).replace(b"\n", b"\n    ")
+        total += len(item) + len(_ENTRIES_SEP)
+        if encoded and total > MAX_MEMORY_CHARS:
             break
-        out.entries.pop(0)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump({"entries": out.to_dict_list()}, f, indent=2)
+        encoded.append(item)
+    encoded.reverse()
+    out = MemoryEntries(entries.entries[len(entries.entries) - len(encoded):])
+    _recent_cache.pop(path, None)
+    _write_atomic(path, _ENTRIES_HEAD + _ENTRIES_SEP.join(encoded) + _ENTRIES_TAIL if encoded else _EMPTY_ENTRIES)
+    signature = _file_signature(path)
+    if signature is not None:
+        _recent_cache[path] = (signature, out)
+
+
+def _save_memory_unlocked(entries: MemoryEntries, memory_file: str | None = None) -> None:
+    """
+    Queue memory for writing by the flush thread (write-behind). Caller must hold _memory_lock.
+    Takes ownership of entries: the internal callers pass the snapshot they just loaded and don't touch it again.
+    """
+    _pending_writes[memory_file or MEMORY_FILE] = entries
+    _flush_event.set()
+
+
+def flush_memory() -> bool:
+    """
+    Write all pending memory files now. Runs on the flush thread, on shutdown signals and at interpreter exit.
+    A file that fails to write (disk full, permissions, a locked file on Windows) stays pending for a retry.
+    Returns True if nothing is left pending.
+    """
+    with _memory_lock:
+        for path in list(_pending_writes):
+            entries = _pending_writes.pop(path)
+            try:
+                _write_memory_unlocked(path, entries)
+            except Exception as e:
+                print(f"[memory] Failed to write {path}, will retry: {e}", file=sys.stderr, flush=True)
+                # Keep the turns instead of dropping them; a newer save for the same file wins
+                _pending_writes.setdefault(path, entries)
+        return not _pending_writes
+
+
+def _flush_worker() -> None:
+    """Wait for saves, let a burst of them settle for WRITE_DELAY_SECONDS, then write them out together."""
+    while True:
+        _flush_event.wait()
+        time.sleep(WRITE_DELAY_SECONDS)
+        _flush_event.clear()
+        if not flush_memory():
+            time.sleep(WRITE_RETRY_SECONDS)
+            _flush_event.set()
+
+
+threading.Thread(target=_flush_worker, name="memory-flush", daemon=True).start()
+atexit.register(flush_memory)
 
 
 def save_memory(entries: MemoryEntries, memory_file: str | None = None) -> None:
-    """Persist memory: trim oldest entries until serialized size <= MAX_MEMORY_CHARS, then write."""
+    """Persist memory: trim oldest entries until serialized size <= MAX_MEMORY_CHARS, then write (shortly, on the flush thread)."""
     with _memory_lock:
-        _save_memory_unlocked(entries, memory_file)
+        _save_memory_unlocked(MemoryEntries(entries.entries), memory_file)  # the caller keeps its own list
 
 
 def add_to_memory(entry: MemoryEntry, memory_file: str | None = None) -> str:
     """
-    Append a MemoryEntry to short-term memory. Content and image_context are capped before saving.
+    Append a MemoryEntry to short-term memory. An assistant entry's source URLs are capped before saving.
     If entry.timestamp is empty, a new one is assigned.
     memory_file: path to persona memory JSON; if None, uses global MEMORY_FILE.
     Returns the timestamp of the created entry (for UI remove-from-memory).
     """
+    # Store a copy as it would be re-read from disk, so the cache never aliases the caller's object
+    # (e.g. its in-memory-only web_context or later mutations). Built before taking the lock: it only reads entry.
+    stored = MemoryEntry.from_dict(entry.to_dict())
+    if stored.sources and entry.role == "assistant":
+        # islice stops after MAX_SOURCES, however many URLs a web search returned
+        stored.sources = list(
+            islice((str(u).strip()[:MAX_SOURCE_URL_CHARS] for u in stored.sources if u), MAX_SOURCES)
+        )
+
     with _memory_lock:
+        ts = entry.timestamp or _new_timestamp()
+        entry.timestamp = stored.timestamp = ts
         data = _load_memory_unlocked(memory_file)
-        ts = entry.timestamp or datetime.now(timezone.utc).isoformat()
-        content = _cap_content(entry.content)
-        image_context = entry.image_context
-        if image_context:
-            normalized = (image_context or "").replace("\n", " ").replace("\r", " ").strip()
-            image_context = _cap_content(normalized, MAX_IMAGE_CONTEXT_CHARS)
-        sources = entry.sources
-        if sources and entry.role == "assistant":
-            sources = [str(u).strip()[:MAX_SOURCE_URL_CHARS] for u in sources if u][:MAX_SOURCES]
-        else:
-            sources = []
-        generated_image_prompt = None
-        if entry.generated_image_prompt and entry.role == "assistant":
-            generated_image_prompt = _cap_content(entry.generated_image_prompt)
-
-        entry.timestamp = ts
-        data.entries.append(entry)
+        data.entries.append(stored)
         _save_memory_unlocked(data, memory_file)
     return ts
 
@@ -130,38 +284,55 @@ def add_to_memory(entry: MemoryEntry, memory_file: str | None = None) -> str:
 def update_entry(timestamp: str, updates: dict, memory_file: str | None = None) -> bool:
     """
     Update an existing entry by timestamp. updates can include content, summarized_content,
-    generated_image_path, generated_image_prompt, etc. Content and generated_image_prompt are capped. Returns True if updated.
+    generated_image_path and generated_image_prompt; other keys are ignored. Content, summarized_content and
+    generated_image_prompt are capped. Returns True if the entry exists and updates had at least one of those keys.
     """
+    # Cap outside the lock; keys update_entry doesn't handle are ignored, and if none are left there is nothing to do
+    changes = {}
+    if "content" in updates:
+        changes["content"] = _cap_content(updates["content"])
+    if "summarized_content" in updates:
+        changes["summarized_content"] = _cap_content(updates["summarized_content"])
+    if "generated_image_path" in updates:
+        changes["generated_image_path"] = updates["generated_image_path"]
+    if "generated_image_prompt" in updates:
+        changes["generated_image_prompt"] = _cap_content(updates["generated_image_prompt"], MAX_ITEM_CHARS)
+    if not changes:
+        return False
     with _memory_lock:
         data = _load_memory_unlocked(memory_file)
-        for e in data.entries:
-            if e.timestamp == timestamp:
-                if "content" in updates:
-                    e.content = _cap_content(updates["content"])
-                if "summarized_content" in updates:
-                    e.summarized_content = _cap_content(updates["summarized_content"])
-                if "generated_image_path" in updates:
-                    e.generated_image_path = updates["generated_image_path"]
-                if "generated_image_prompt" in updates:
-                    e.generated_image_prompt = _cap_content(updates["generated_image_prompt"], MAX_ITEM_CHARS)
-                _save_memory_unlocked(data, memory_file)
-                return True
-    return False
+        i = data.index_of(timestamp)
+        if i < 0:
+            return False
+        e = data.entries[i]
+        changed = False
+        for name, value in changes.items():
+            if getattr(e, name) != value:
+                setattr(e, name, value)
+                changed = True
+        # Re-submitting the stored values doesn't queue a rewrite of the file
+        if changed:
+            _save_memory_unlocked(data, memory_file)
+        return True
+
+
+async def async_update_entry(timestamp: str, updates: dict, memory_file: str | None = None) -> bool:
+    """
+    update_entry for asyncio callers (e.g. around agent_core.answer_astream). Runs on a worker thread so waiting
+    for _memory_lock while the flush thread writes and fsyncs a file never blocks the event loop.
+    """
+    return await asyncio.to_thread(update_entry, timestamp, updates, memory_file)
 
 
 def delete_entry(timestamp: str, memory_file: str | None = None) -> bool:
     """Remove the entry with the given timestamp. Deletes its generated image file if any. Returns True if one was removed."""
     with _memory_lock:
         data = _load_memory_unlocked(memory_file)
-        removed = None
-        for e in data.entries:
-            if e.timestamp == timestamp:
-                removed = e
-                break
-        if removed is None:
+        i = data.index_of(timestamp)
+        if i < 0:
             return False
+        removed = data.entries.pop(i)
         _delete_generated_image_file(removed.generated_image_path)
-        data.entries = [e for e in data.entries if e.timestamp != timestamp]
         _save_memory_unlocked(data, memory_file)
         return True
 
@@ -170,14 +341,23 @@ def clear_memory(memory_file: str | None = None) -> None:
     """Remove all entries from memory and delete their generated image files."""
     with _memory_lock:
         data = _load_memory_unlocked(memory_file)
-        for e in data.entries:
-            _delete_generated_image_file(e.generated_image_path)
+        fs_paths = [p for p in (_generated_image_fs_path(e.generated_image_path) for e in data.entries) if p]
+        for fs_path in fs_paths:
+            try:
+                os.unlink(fs_path)
+            except OSError:
+                pass
         path = memory_file or MEMORY_FILE
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump({"entries": []}, f, indent=2)
+        _pending_writes.pop(path, None)
+        _recent_cache.pop(path, None)
+        _write_atomic(path, _EMPTY_ENTRIES)
 
 
 def get_recent_memory(memory_file: str | None = None) -> MemoryEntries:
-    """Return all memory entries as a MemoryEntries instance (already size-limited when saved)."""
+    """
+    Return all memory entries as a MemoryEntries instance (already size-limited when saved).
+    Served from the in-process cache unless the file changed outside this module. The list is the caller's own
+    snapshot, but the entry objects are shared with the cache: read them, don't modify them (use update_entry).
+    """
     with _memory_lock:
         return _load_memory_unlocked(memory_file)
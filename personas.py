@@ -8,12 +8,15 @@ Each persona lives in .personas/<persona_id>/ with:
 
 .personas/ is created on first use (gitignored). Add persona configs there; see README for an example.
 
-decisions: per-persona toggles for LLM-based decisions (each runs once per turn). Omitted keys default to true.
+decisions: per-persona toggles for LLM-based decisions (each runs once per turn). Omitted keys default to true,
+  except decide_prior_image_context, which defaults to false.
   image_generation: whether to detect "generate an image" and route to image gen.
   web_search: whether to detect need for current info and run web search.
   prior_image_context: whether to include prior image context from memory when formatting context.
+  decide_prior_image_context: when prior image context is included, ask each turn whether it is needed (opt-in).
 """
 import json
+import os
 from pathlib import Path
 
 from app_types.persona import (
@@ -37,26 +40,67 @@ _ROOT = Path(__file__).resolve().parent
 PERSONAS_DIR = _ROOT / ".personas"
 MEMORY_FILENAME = "memory.json"
 
+# Parsed persona configs keyed by config path -> ((mtime_ns, size), config). Re-read when the file changes.
+_config_cache: dict[str, tuple[tuple[int, int], dict]] = {}
+
 
 def _ensure_personas_dir():
     """Create .personas if it does not exist so the app can run. Users add persona configs here (see README)."""
     PERSONAS_DIR.mkdir(parents=True, exist_ok=True)
 
 
+def _cached_config(config_path: Path) -> dict | None:
+    """
+    Parse a persona config file, reusing the cached parse while its mtime and size are unchanged.
+    Returns the shared cached dict (do not mutate it) or None if invalid.
+    """
+    try:
+        st = config_path.stat()
+    except OSError:
+        return None
+    signature = (st.st_mtime_ns, st.st_size)
+    key = str(config_path)
+    cached = _config_cache.get(key)
+    if cached and cached[0] == signature:
+        return cached[1]
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return None
+    _config_cache[key] = (signature, cfg)
+    return cfg
+
+
+def _load_config(config_path: Path) -> dict | None:
+    """Like _cached_config, but returns a copy the caller may modify."""
+    cfg = _cached_config(config_path)
+    return dict(cfg) if cfg is not None else None
+
+
+def clear_persona_cache() -> None:
+    """Drop all cached persona configs so the next lookup re-reads them from disk."""
+    _config_cache.clear()
+
+
 def _persona_dirs():
-    """Yield (persona_id, dir_path) for each persona directory that has a config."""
-    if not PERSONAS_DIR.is_dir():
+    """Yield (persona_id, dir_path, config_path) for each persona directory that has a config."""
+    try:
+        it = os.scandir(PERSONAS_DIR)
+    except OSError:
         return
-    for child in PERSONAS_DIR.iterdir():
-        if not child.is_dir():
-            continue
-        persona_id = child.name
-        # Support both <id>.config and config
-        config_candidates = [child / f"{persona_id}.config", child / "config"]
-        for candidate in config_candidates:
-            if candidate.is_file():
-                yield (persona_id, child)
-                break
+    with it:
+        for entry in it:
+            # DirEntry.is_dir uses the d_type from the directory listing, so no stat for plain directories
+            if not entry.is_dir():
+                continue
+            # Support both <id>.config and config
+            config_path = os.path.join(entry.path, f"{entry.name}.config")
+            if not os.path.isfile(config_path):
+                config_path = os.path.join(entry.path, "config")
+                if not os.path.isfile(config_path):
+                    continue
+            yield (entry.name, Path(entry.path), Path(config_path))
 
 
 def list_personas(public_only: bool = False) -> list[dict]:
@@ -66,16 +110,9 @@ def list_personas(public_only: bool = False) -> list[dict]:
     """
     _ensure_personas_dir()
     result = []
-    for persona_id, dir_path in _persona_dirs():
-        config_path = dir_path / f"{persona_id}.config"
-        if not config_path.is_file():
-            config_path = dir_path / "config"
-        if not config_path.is_file():
-            continue
-        try:
-            with open(config_path, "r", encoding="utf-8") as f:
-                cfg = json.load(f)
-        except (json.JSONDecodeError, OSError):
+    for persona_id, dir_path, config_path in _persona_dirs():
+        cfg = _cached_config(config_path)  # read-only here, so no copy
+        if cfg is None:
             continue
         if public_only and not cfg.get("public", True):
             continue
@@ -104,10 +141,8 @@ def get_persona_config(persona_id: str) -> dict | None:
         config_path = dir_path / "config"
     if not config_path.is_file():
         return None
-    try:
-        with open(config_path, "r", encoding="utf-8") as f:
-            cfg = json.load(f)
-    except (json.JSONDecodeError, OSError):
+    cfg = _load_config(config_path)
+    if cfg is None:
         return None
     cfg["memory_path"] = str(dir_path / MEMORY_FILENAME)
     return cfg
@@ -9,24 +9,44 @@ OUTPUT_DIR = os.path.join(os.path.dirname(__file__), ".personas", "emily-prompt"
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-for i in range(10):
-    with open(PROMPTS_FILE, "r", encoding="utf-8") as f:
-        prompts = json.load(f)
-    if not prompts:
-        break
-    # Take and remove the first prompt each time so we process in order and don't skip
-    user_input = prompts.pop(0)
-    save_path = os.path.join(OUTPUT_DIR, f"out_{i}.png")
-    generate_image(user_input, save_path)
-    with open(PROMPTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(prompts, f, indent=2)
-
-    # Append this prompt and image path to prompt_images.json (load existing array, add one, write back)
-    if os.path.isfile(PROMPT_IMAGES_FILE):
-        with open(PROMPT_IMAGES_FILE, "r", encoding="utf-8") as f:
-            prompt_images_list = json.load(f)
-    else:
-        prompt_images_list = []
-    prompt_images_list.append({"prompt": user_input, "image_path": save_path})
-    with open(PROMPT_IMAGES_FILE, "w", encoding="utf-8") as f:
-        json.dump(prompt_images_list, f, indent=2)
\ No newline at end of file
+# Write progress back every few images; generation dominates, so the files are loaded once and kept in memory
+CHECKPOINT_EVERY = 3
+
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+with open(PROMPTS_FILE, "r", encoding="utf-8") as f:
+    prompts = json.load(f)
+if os.path.isfile(PROMPT_IMAGES_FILE):
+    with open(PROMPT_IMAGES_FILE, "r", encoding="utf-8") as f:
+        prompt_images_list = json.load(f)
+else:
+    prompt_images_list = []
+
+done = 0
+try:
+    for i in range(10):
+        if not prompts:
+            break
+        # Process in order; the prompt is only removed once its image exists, so a failure doesn't skip it
+        user_input = prompts[0]
+        save_path = os.path.join(OUTPUT_DIR, f"out_{i}.png")
+        result = generate_image(user_input, save_path, include_base64=False)
+        if result.get("status") != "ok":
+            # generate_image reports failures instead of raising; stop and leave the prompt for the next run
+            print(f"Image generation failed, stopping: {result.get('error')}")
+            break
+        prompts.pop(0)
+        prompt_images_list.append({"prompt": user_input, "image_path": save_path})
+        done += 1
+        if done % CHECKPOINT_EVERY == 0:
+            _write_json(PROMPTS_FILE, prompts)
+            _write_json(PROMPT_IMAGES_FILE, prompt_images_list)
+finally:
+    # Save whatever was generated, including after an error part-way through
+    if done % CHECKPOINT_EVERY:
+        _write_json(PROMPTS_FILE, prompts)
+        _write_json(PROMPT_IMAGES_FILE, prompt_images_list)
@@ -9,28 +9,157 @@ global sleep settings. When you stop the app, normal sleep/lid behavior returns.
 To also keep running with the lid closed when plugged in, set one Windows
 power option: "When plugged in, closing the lid" -> "Do nothing".
 """
+import atexit
+import errno
+import select
+import selectors
+import signal
+import socket
 import sys
 import subprocess
+import threading
 import time
 import os
 
-# Default: check power every 30 seconds
+# Resolved once at import, before anything could change the working directory
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PY = os.path.join(SCRIPT_DIR, "app.py")
+# Default: check power every 30 seconds where power change events aren't available (Linux gets uevents instead)
 CHECK_INTERVAL = int(os.environ.get("OLLAMA_AGENT_POWER_CHECK_SEC", "30"))
+# While power stays connected the polling interval doubles up to this, so an idle laptop wakes rarely
+MAX_CHECK_INTERVAL = max(CHECK_INTERVAL, int(os.environ.get("OLLAMA_AGENT_POWER_CHECK_MAX_SEC", "120")))
+# Netlink protocol for kernel uevents (linux/netlink.h)
+NETLINK_KOBJECT_UEVENT = 15
+# Chargers and USB-PD hubs send bursts of uevents while they negotiate; wait this long for a burst to end
+UEVENT_SETTLE_SECONDS = 0.25
+# Linux power supplies (AC adapters, batteries, USB-PD sources)
+POWER_SUPPLY_DIR = "/sys/class/power_supply"
+
+if sys.platform == "win32":
+    # Win32 bindings, declared once at import instead of on every check
+    import ctypes
+    from ctypes import wintypes
+
+    _kernel32 = ctypes.windll.kernel32  # type: ignore[attr-defined]
+    _user32 = ctypes.windll.user32  # type: ignore[attr-defined]
+    _LRESULT = wintypes.LPARAM
+    _WNDPROC = ctypes.WINFUNCTYPE(_LRESULT, wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM)  # type: ignore[attr-defined]
+
+    class _SYSTEM_POWER_STATUS(ctypes.Structure):
+        _fields_ = [
+            ("ACLineStatus", wintypes.BYTE),
+            ("BatteryFlag", wintypes.BYTE),
+            ("BatteryLifePercent", wintypes.BYTE),
+            ("Reserved1", wintypes.BYTE),
+            ("BatteryLifeTime", wintypes.DWORD),
+            ("BatteryFullLifeTime", wintypes.DWORD),
+        ]
+
+    class _GUID(ctypes.Structure):
+        _fields_ = [
+            ("Data1", wintypes.DWORD),
+            ("Data2", wintypes.WORD),
+            ("Data3", wintypes.WORD),
+            ("Data4", ctypes.c_ubyte * 8),
+        ]
+
+    class _POWERBROADCAST_SETTING(ctypes.Structure):
+        _fields_ = [("PowerSetting", _GUID), ("DataLength", wintypes.DWORD), ("Data", wintypes.DWORD)]
+
+    class _WNDCLASSW(ctypes.Structure):
+        _fields_ = [
+            ("style", wintypes.UINT),
+            ("lpfnWndProc", _WNDPROC),
+            ("cbClsExtra", ctypes.c_int),
+            ("cbWndExtra", ctypes.c_int),
+            ("hInstance", wintypes.HINSTANCE),
+            ("hIcon", wintypes.HICON),
+            ("hCursor", wintypes.HANDLE),
+            ("hbrBackground", wintypes.HBRUSH),
+            ("lpszMenuName", wintypes.LPCWSTR),
+            ("lpszClassName", wintypes.LPCWSTR),
+        ]
+
+    class _REASON_DETAILED(ctypes.Structure):
+        _fields_ = [
+            ("LocalizedReasonModule", wintypes.HMODULE),
+            ("LocalizedReasonId", wintypes.ULONG),
+            ("ReasonStringCount", wintypes.ULONG),
+            ("ReasonStrings", ctypes.POINTER(wintypes.LPWSTR)),
+        ]
+
+    class _REASON_UNION(ctypes.Union):
+        _fields_ = [("Detailed", _REASON_DETAILED), ("SimpleReasonString", wintypes.LPWSTR)]
+
+    class _REASON_CONTEXT(ctypes.Structure):
+        _fields_ = [("Version", wintypes.ULONG), ("Flags", wintypes.DWORD), ("Reason", _REASON_UNION)]
+
+    # GUID_ACDC_POWER_SOURCE {5D3E9A59-E9D5-4B00-A6BD-FF34FF516548}
+    _GUID_ACDC_POWER_SOURCE = _GUID(
+        0x5D3E9A59, 0xE9D5, 0x4B00, (ctypes.c_ubyte * 8)(0xA6, 0xBD, 0xFF, 0x34, 0xFF, 0x51, 0x65, 0x48)
+    )
+    # Explicit prototypes: handles and LPARAM are pointer-sized on 64-bit, and ctypes skips its argument guessing
+    _kernel32.GetSystemPowerStatus.argtypes = [ctypes.POINTER(_SYSTEM_POWER_STATUS)]
+    _kernel32.GetSystemPowerStatus.restype = wintypes.BOOL
+    _kernel32.PowerCreateRequest.argtypes = [ctypes.POINTER(_REASON_CONTEXT)]
+    _kernel32.PowerCreateRequest.restype = wintypes.HANDLE
+    _kernel32.PowerSetRequest.argtypes = [wintypes.HANDLE, ctypes.c_int]
+    _kernel32.PowerSetRequest.restype = wintypes.BOOL
+    _kernel32.PowerClearRequest.argtypes = [wintypes.HANDLE, ctypes.c_int]
+    _kernel32.PowerClearRequest.restype = wintypes.BOOL
+    _kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    _kernel32.CloseHandle.restype = wintypes.BOOL
+    _kernel32.GetModuleHandleW.argtypes = [wintypes.LPCWSTR]
+    _kernel32.GetModuleHandleW.restype = wintypes.HMODULE
+    _user32.DefWindowProcW.argtypes = [wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM]
+    _user32.DefWindowProcW.restype = _LRESULT
+    _user32.RegisterClassW.argtypes = [ctypes.POINTER(_WNDCLASSW)]
+    _user32.RegisterClassW.restype = wintypes.ATOM
+    _user32.CreateWindowExW.argtypes = [
+        wintypes.DWORD, wintypes.LPCWSTR, wintypes.LPCWSTR, wintypes.DWORD,
+        ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+        wintypes.HWND, wintypes.HMENU, wintypes.HINSTANCE, wintypes.LPVOID,
+    ]
+    _user32.CreateWindowExW.restype = wintypes.HWND
+    _user32.RegisterPowerSettingNotification.argtypes = [wintypes.HANDLE, ctypes.POINTER(_GUID), wintypes.DWORD]
+    _user32.RegisterPowerSettingNotification.restype = wintypes.HANDLE
+    _user32.GetMessageW.argtypes = [ctypes.POINTER(wintypes.MSG), wintypes.HWND, wintypes.UINT, wintypes.UINT]
+    _user32.GetMessageW.restype = wintypes.BOOL
+    _user32.TranslateMessage.argtypes = [ctypes.POINTER(wintypes.MSG)]
+    _user32.DispatchMessageW.argtypes = [ctypes.POINTER(wintypes.MSG)]
+    _user32.DispatchMessageW.restype = _LRESULT
+    # Reused by every is_plugged_in_windows call (main thread only)
+    _power_status = _SYSTEM_POWER_STATUS()
+    _power_status_ref = ctypes.byref(_power_status)
 
 
 def request_stay_awake():
     """
     Ask Windows to avoid sleeping while this process is running.
     Has no effect on other OSes. When the process exits, the request is cleared.
+    Uses a process-wide power request (listed by powercfg /requests), so it doesn't depend on which thread made it;
+    falls back to SetThreadExecutionState if one can't be created.
     """
     if sys.platform != "win32":
         return
     try:
-        import ctypes
-        kernel32 = ctypes.windll.kernel32  # type: ignore[attr-defined]
+        POWER_REQUEST_CONTEXT_SIMPLE_STRING = 0x1
+        POWER_REQUEST_SYSTEM_REQUIRED = 1  # POWER_REQUEST_TYPE.PowerRequestSystemRequired
+        reason = _REASON_CONTEXT(Version=0, Flags=POWER_REQUEST_CONTEXT_SIMPLE_STRING)
+        reason.Reason.SimpleReasonString = "Jarvis web app is running"
+        handle = _kernel32.PowerCreateRequest(ctypes.byref(reason))
+        if handle and handle != wintypes.HANDLE(-1).value:
+            if _kernel32.PowerSetRequest(handle, POWER_REQUEST_SYSTEM_REQUIRED):
+                def clear():
+                    _kernel32.PowerClearRequest(handle, POWER_REQUEST_SYSTEM_REQUIRED)
+                    _kernel32.CloseHandle(handle)
+
+                atexit.register(clear)
+                return
+            _kernel32.CloseHandle(handle)
         ES_CONTINUOUS = 0x80000000
         ES_SYSTEM_REQUIRED = 0x00000001
-        kernel32.SetThreadExecutionState(ES_CONTINUOUS | ES_SYSTEM_REQUIRED)
+        _kernel32.SetThreadExecutionState(ES_CONTINUOUS | ES_SYSTEM_REQUIRED)
     except Exception:
         pass
 
@@ -38,82 +167,343 @@ def request_stay_awake():
 def is_plugged_in_windows():
     """True if AC power is connected (Windows)."""
     try:
-        import ctypes
-        from ctypes import wintypes
-        kernel32 = ctypes.windll.kernel32  # type: ignore[attr-defined]
-        class SYSTEM_POWER_STATUS(ctypes.Structure):
-            _fields_ = [
-                ("ACLineStatus", wintypes.BYTE),
-                ("BatteryFlag", wintypes.BYTE),
-                ("BatteryLifePercent", wintypes.BYTE),
-                ("Reserved1", wintypes.BYTE),
-                ("BatteryLifeTime", wintypes.DWORD),
-                ("BatteryFullLifeTime", wintypes.DWORD),
-            ]
-        status = SYSTEM_POWER_STATUS()
-        if kernel32.GetSystemPowerStatus(ctypes.byref(status)) == 0:
+        if not _kernel32.GetSystemPowerStatus(_power_status_ref):
             return True  # assume plugged in if we can't read
         # ACLineStatus: 0 = offline (battery), 1 = online (AC)
-        return status.ACLineStatus == 1
+        return _power_status.ACLineStatus == 1
     except Exception:
         return True  # if we can't detect, allow running
 
 
+def _open_power_source():
+    """
+    Find the file that tells whether AC is connected (Linux), in one pass over /sys/class/power_supply:
+    the "online" file of the first Mains supply (AC, ACAD, ADP1, ...), else a battery's "status" file.
+    Returns (fd, is_battery_status), or None if there is neither.
+    """
+    try:
+        it = os.scandir(POWER_SUPPLY_DIR)
+    except OSError:
+        return None
+    with it:
+        entries = sorted(it, key=lambda e: e.name)
+    battery_status = None
+    for entry in entries:
+        try:
+            with open(os.path.join(entry.path, "type"), "rb") as f:
+                kind = f.read().strip()
+        except OSError:
+            continue
+        if kind == b"Mains":
+            try:
+                return (os.open(os.path.join(entry.path, "online"), os.O_RDONLY | os.O_CLOEXEC), False)
+            except OSError:
+                continue
+        if kind == b"Battery" and battery_status is None:
+            battery_status = os.path.join(entry.path, "status")
+    if battery_status:
+        try:
+            return (os.open(battery_status, os.O_RDONLY | os.O_CLOEXEC), True)
+        except OSError:
+            pass
+    return None
+
+
+# (fd, is_battery_status) of the file read for the AC state, opened on first check and re-read in place
+# (False: none found; None: not looked up yet)
+_power_source = None
+
+
 def is_plugged_in():
+    global _power_source
     if sys.platform == "win32":
         return is_plugged_in_windows()
-    # Linux: often in /sys/class/power_supply/AC/online or BAT0/status
+    # Linux: a Mains supply's online file (e.g. /sys/class/power_supply/AC/online), else BAT0/status
+    if _power_source is None:
+        _power_source = _open_power_source() or False
+    if not _power_source:
+        return True  # allow running if we can't detect
+    fd, is_battery_status = _power_source
     try:
-        for name in ("AC", "ACAD", "AC0"):
-            p = os.path.join("/sys/class/power_supply", name, "online")
-            if os.path.isfile(p):
-                with open(p) as f:
-                    return f.read().strip() == "1"
-    except Exception:
+        # sysfs regenerates the value on every read from offset 0, so the file never needs reopening
+        value = os.pread(fd, 16, 0)
+    except OSError:
+        # The supply's device went away: look it up again on the next check
+        os.close(fd)
+        _power_source = None
+        return True
+    if is_battery_status:
+        # Charging, Full and "Not charging" all mean AC is connected
+        return not value.startswith(b"Discharging")
+    return value.startswith(b"1")
+
+
+def _open_uevent_socket():
+    """Subscribe to kernel uevents on Linux. Returns the netlink socket, or None where that isn't available."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_CLOEXEC, NETLINK_KOBJECT_UEVENT)
+    except (AttributeError, OSError):
+        return None
+    try:
+        sock.bind((0, 1))  # port 0: let the kernel pick; group 1: kernel uevents
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def _open_pidfd(proc):
+    """A file descriptor that becomes readable when proc exits (Linux 5.3+), or None."""
+    try:
+        return os.pidfd_open(proc.pid)
+    except (AttributeError, OSError):
+        return None
+
+
+# uevent payloads are NUL-separated KEY=value fields; matching whole fields is one C-level scan per event
+_UEVENT_POWER_SUPPLY = b"\0SUBSYSTEM=power_supply\0"
+_UEVENT_BATTERY = b"\0POWER_SUPPLY_TYPE=Battery\0"
+
+
+def _is_power_uevent(msg):
+    """True for uevents that can mean AC was connected or disconnected."""
+    if _UEVENT_POWER_SUPPLY not in msg:
+        return False
+    # Batteries report capacity changes every minute or so; those only matter when battery status is the source
+    return _UEVENT_BATTERY not in msg or bool(_power_source and _power_source[1])
+
+
+def _recv_uevents_settled(sock):
+    """
+    Read the pending uevent, then any that follow within UEVENT_SETTLE_SECONDS of each other.
+    Returns True if any was a power_supply event, so the state is read once, after a burst has settled.
+    """
+    power = False
+    while True:
+        try:
+            power = _is_power_uevent(sock.recv(8192)) or power
+        except OSError as e:
+            if e.errno != errno.ENOBUFS:
+                raise
+            power = True  # events were dropped: re-read the state
+        if not select.select([sock], [], [], UEVENT_SETTLE_SECONDS if power else 0)[0]:
+            return power
+
+
+def _signal_wakeup_fd():
+    """
+    Route SIGINT and SIGTERM to a pipe that the POSIX waits select on, so Ctrl-C or a service manager's stop wakes
+    them like any other event. (SIGTERM used to kill this process and leave the app running.)
+    Returns the pipe's read end, or None on Windows, where Ctrl-C keeps raising KeyboardInterrupt.
+    """
+    if sys.platform == "win32":
+        return None
+    r, w = os.pipe()
+    os.set_blocking(w, False)
+    signal.set_wakeup_fd(w)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: None)
+    return r
+
+
+def _wait_power_uevents(proc, sock, wake_fd):
+    """
+    Block until power is unplugged (True) or the app exits (False). sock must have been subscribed before the
+    startup power check, which serves as the baseline: every change since then arrives as an event.
+    Wakes only for power_supply uevents, a signal on wake_fd (raises KeyboardInterrupt) and, where a pidfd is
+    available, the app exiting; without one the app is checked every CHECK_INTERVAL.
+    """
+    pidfd = _open_pidfd(proc)
+    sel = selectors.DefaultSelector()
+    sel.register(sock, selectors.EVENT_READ)
+    sel.register(wake_fd, selectors.EVENT_READ)
+    if pidfd is not None:
+        sel.register(pidfd, selectors.EVENT_READ)
+    timeout = None if pidfd is not None else CHECK_INTERVAL
+    try:
+        while True:
+            ready = [key.fileobj for key, _ in sel.select(timeout)]
+            if wake_fd in ready:
+                raise KeyboardInterrupt  # SIGINT/SIGTERM: shut down as for Ctrl-C
+            if proc.poll() is not None:
+                return False
+            if sock in ready and _recv_uevents_settled(sock) and not is_plugged_in():
+                return True
+    finally:
+        sel.close()
+        if pidfd is not None:
+            os.close(pidfd)
+
+
+def _wait_power_windows(proc):
+    """
+    Block until power is unplugged (True) or the app exits (False). A hidden message-only window on a background
+    thread receives AC/DC change notifications and stops the app on unplug, so nothing polls.
+    Returns None if the notification can't be registered.
+    """
+    unplugged = threading.Event()
+    changed = threading.Event()  # unplugged, or the app exited
+    ready = threading.Event()
+    registered = []
+
+    def watch():
+        try:
+            WM_POWERBROADCAST = 0x0218
+            PBT_POWERSETTINGCHANGE = 0x8013
+            DEVICE_NOTIFY_WINDOW_HANDLE = 0
+            HWND_MESSAGE = wintypes.HWND(-3)
+            PO_AC = 0  # SYSTEM_POWER_CONDITION: 0 = AC, 1 = battery, 2 = short-term (UPS)
+            acdc = bytes(_GUID_ACDC_POWER_SOURCE)
+
+            def wndproc(hwnd, msg, wparam, lparam):
+                if msg == WM_POWERBROADCAST and wparam == PBT_POWERSETTINGCHANGE and lparam:
+                    setting = ctypes.cast(lparam, ctypes.POINTER(_POWERBROADCAST_SETTING)).contents
+                    if bytes(setting.PowerSetting) == acdc and setting.Data != PO_AC:
+                        unplugged.set()
+                        changed.set()
+                    return 1
+                return _user32.DefWindowProcW(hwnd, msg, wparam, lparam)
+
+            callback = _WNDPROC(wndproc)  # referenced for the life of the loop so ctypes doesn't free it
+            hinstance = _kernel32.GetModuleHandleW(None)
+            wc = _WNDCLASSW(lpfnWndProc=callback, hInstance=hinstance, lpszClassName="JarvisPowerWatch")
+            if not _user32.RegisterClassW(ctypes.byref(wc)):
+                return
+            hwnd = _user32.CreateWindowExW(0, wc.lpszClassName, None, 0, 0, 0, 0, 0, HWND_MESSAGE, None, hinstance, None)
+            # Windows sends the current AC/DC state right after registering, then each change
+            if not hwnd or not _user32.RegisterPowerSettingNotification(
+                hwnd, ctypes.byref(_GUID_ACDC_POWER_SOURCE), DEVICE_NOTIFY_WINDOW_HANDLE
+            ):
+                return
+            registered.append(True)
+            ready.set()
+            msg = wintypes.MSG()
+            while _user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+                _user32.TranslateMessage(ctypes.byref(msg))
+                _user32.DispatchMessageW(ctypes.byref(msg))
+        except Exception:
+            pass
+        finally:
+            ready.set()
+
+    threading.Thread(target=watch, name="power-watch", daemon=True).start()
+    ready.wait()
+    if not registered:
+        return None
+
+    def wait_app():
+        proc.wait()
+        changed.set()
+
+    threading.Thread(target=wait_app, name="app-wait", daemon=True).start()
+    # Timed waits, so Ctrl-C still reaches this process (the app, in its own process group, no longer sees it)
+    while not changed.wait(1.0):
         pass
-    return True  # allow running if we can't detect
+    return unplugged.is_set()
+
+
+def _wait_power_poll(proc, wake_fd):
+    """
+    Block until power is unplugged (True) or the app exits (False). Checks power after CHECK_INTERVAL, then
+    backs off to MAX_CHECK_INTERVAL while it stays plugged in.
+    Where a pidfd is available the app exiting ends the wait at once instead of at the next check; a signal on
+    wake_fd (POSIX) raises KeyboardInterrupt.
+    """
+    pidfd = _open_pidfd(proc)
+    fds = [fd for fd in (pidfd, wake_fd) if fd is not None]
+    interval = CHECK_INTERVAL
+    try:
+        while True:
+            if fds:
+                ready = select.select(fds, [], [], interval)[0]
+                if wake_fd is not None and wake_fd in ready:
+                    raise KeyboardInterrupt  # SIGINT/SIGTERM: shut down as for Ctrl-C
+                if ready:
+                    return False
+            else:
+                time.sleep(interval)
+            if not is_plugged_in():
+                return True
+            if proc.poll() is not None:
+                return False
+            interval = min(interval * 2, MAX_CHECK_INTERVAL)
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+
+
+def _stop_app(proc, timeout):
+    """
+    Ask the app to exit, wait up to timeout seconds for it to exit, then kill it. The request is SIGTERM, or
+    CTRL_BREAK_EVENT on Windows (where terminate() is TerminateProcess), so the app writes pending memory first.
+    """
+    pidfd = _open_pidfd(proc)
+    if sys.platform == "win32":
+        proc.send_signal(signal.CTRL_BREAK_EVENT)
+    else:
+        proc.terminate()
+    if pidfd is None:
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        return
+    # Popen.wait(timeout) polls waitpid with growing sleeps; the pidfd becomes readable the moment the app exits
+    try:
+        if select.select([pidfd], [], [], timeout)[0]:
+            proc.wait()  # reap; returns at once
+        else:
+            proc.kill()
+    finally:
+        os.close(pidfd)
 
 
 def main():
+    # Subscribe before the startup check, so a change after it (even while the app starts) arrives as an event
+    sock = _open_uevent_socket()
     if not is_plugged_in():
         print("Not plugged in. Exiting. (Run when on AC power to start the server.)")
         sys.exit(1)
 
     request_stay_awake()
 
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    app_py = os.path.join(script_dir, "app.py")
-    if not os.path.isfile(app_py):
+    if not os.path.isfile(APP_PY):
         print("app.py not found next to run_when_plugged.py")
         sys.exit(1)
 
     proc = subprocess.Popen(
-        [sys.executable, app_py],
-        cwd=script_dir,
+        [sys.executable, APP_PY],
+        cwd=SCRIPT_DIR,
         stdin=subprocess.DEVNULL,
-        stdout=sys.stdout,
-        stderr=sys.stderr,
+        # Its own process group on Windows, so CTRL_BREAK_EVENT can be sent to the app alone
+        creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == "win32" else 0,
+        # stdout/stderr left as None: the app inherits ours directly, with no per-stream dup2 in the child
     )
 
+    wake_fd = _signal_wakeup_fd()
     try:
-        while True:
-            time.sleep(CHECK_INTERVAL)
-            if not is_plugged_in():
-                print("\nPower unplugged. Stopping server.")
-                proc.terminate()
-                try:
-                    proc.wait(timeout=10)
-                except subprocess.TimeoutExpired:
-                    proc.kill()
-                sys.exit(0)
-            if proc.poll() is not None:
-                sys.exit(proc.returncode or 0)
+        unplugged = None
+        if sys.platform == "win32":
+            unplugged = _wait_power_windows(proc)
+        elif sock is not None:
+            with sock:
+                unplugged = _wait_power_uevents(proc, sock, wake_fd)
+        if unplugged is None:
+            unplugged = _wait_power_poll(proc, wake_fd)
+        if unplugged:
+            print("\nPower unplugged. Stopping server.")
+            _stop_app(proc, 10)
+            # Fast exit on battery: the app is already stopped, so skip interpreter teardown. atexit hooks don't run;
+            # the only one (clearing the Windows power request) is released by process exit anyway.
+            # Every other exit uses sys.exit and runs the normal cleanup.
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(0)
+        sys.exit(proc.wait() or 0)
     except KeyboardInterrupt:
-        proc.terminate()
-        try:
-            proc.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            proc.kill()
+        _stop_app(proc, 5)
         sys.exit(0)
 
 